@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Пакетная обработка каталога с видео без интерфейса: python -m backend.batch путь/к/каталогу
+       Модели OCR загружаются один раз в каждом рабочем процессе и используются для всех видео,
+       несколько видео обрабатываются одновременно, состояние каждого видео сохраняется в JSON-манифесте,
+       поэтому повторный запуск пропускает уже обработанные видео
+"""
+import os
+import sys
+import argparse
+import json
+import multiprocessing
+import time
+import traceback
+
+# Расширения файлов, которые считаются видео
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.flv', '.wmv', '.webm', '.ts', '.m4v', '.rmvb')
+# Имя файла манифеста по умолчанию
+MANIFEST_NAME = 'batch_manifest.json'
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Объект распознавания текста рабочего процесса, создается один раз при запуске процесса
+_warm_ocr = None
+
+
+def _init_worker():
+    """
+    Инициализация рабочего процесса: загрузка моделей OCR
+    """
+    global _warm_ocr
+    import backend.main
+    _warm_ocr = backend.main.OcrRecogniser()
+
+
+def process_video(video_path):
+    """
+    Извлечение субтитров одного видео в рабочем процессе с уже загруженными моделями
+    :return (путь к видео, запись манифеста)
+    """
+    import backend.main
+    start_time = time.time()
+    try:
+        extractor = backend.main.SubtitleExtractor(video_path, None, interactive=False, inline_ocr=True,
+                                                   use_ocr_cache=False)
+        extractor.ocr = _warm_ocr
+        extractor.run()
+        srt_path = os.path.splitext(video_path)[0] + '.srt'
+        return video_path, {'status': STATUS_DONE,
+                            'srt': srt_path if os.path.exists(srt_path) else None,
+                            'elapsed': round(time.time() - start_time, 2),
+                            'error': None}
+    except Exception:
+        return video_path, {'status': STATUS_FAILED,
+                            'srt': None,
+                            'elapsed': round(time.time() - start_time, 2),
+                            'error': traceback.format_exc()}
+
+
+def find_videos(video_dir):
+    """
+    Видеофайлы каталога (без подкаталогов), отсортированные по имени
+    """
+    return sorted(os.path.join(video_dir, name) for name in os.listdir(video_dir)
+                  if name.lower().endswith(VIDEO_EXTENSIONS) and os.path.isfile(os.path.join(video_dir, name)))
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {'videos': {}}
+    with open(manifest_path, mode='r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_path, manifest):
+    """
+    Запись манифеста через временный файл, чтобы прерванный запуск не оставил поврежденный манифест
+    """
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+
+
+def run_batch(video_dir, workers=1, manifest_path=None, force=False):
+    """
+    Обработка всех видео каталога пулом рабочих процессов
+    :param workers количество одновременно обрабатываемых видео (и копий моделей OCR в памяти)
+    :param force обработать заново видео, уже отмеченные в манифесте как обработанные
+    :return манифест
+    """
+    manifest_path = manifest_path or os.path.join(video_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    videos = manifest['videos']
+    todo = []
+    skipped = 0
+    for video_path in find_videos(video_dir):
+        key = os.path.basename(video_path)
+        if not force and videos.get(key, {}).get('status') == STATUS_DONE:
+            skipped += 1
+            continue
+        videos[key] = {'status': STATUS_PENDING, 'srt': None, 'elapsed': None, 'error': None}
+        todo.append(video_path)
+    save_manifest(manifest_path, manifest)
+    print(f'Видео для обработки: {len(todo)}, пропущено: {skipped}')
+    if len(todo) == 0:
+        return manifest
+    start_time = time.time()
+    workers = max(min(workers, len(todo)), 1)
+    failed_count = 0
+    with multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker) as pool:
+        for video_path, entry in pool.imap_unordered(process_video, todo):
+            videos[os.path.basename(video_path)] = entry
+            save_manifest(manifest_path, manifest)
+            if entry['status'] == STATUS_DONE:
+                print(f"Готово: {video_path} за {entry['elapsed']} секунд")
+            else:
+                failed_count += 1
+                print(f"Ошибка: {video_path}\n{entry['error']}")
+    print(f'Пакетная обработка завершена за {round(time.time() - start_time, 2)} секунд, '
+          f'обработано: {len(todo) - failed_count}, с ошибками: {failed_count}')
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Пакетное извлечение субтитров из всех видео каталога')
+    parser.add_argument('video_dir', help='Каталог с видео')
+    parser.add_argument('--workers', type=int, default=1, help='Количество одновременно обрабатываемых видео')
+    parser.add_argument('--manifest', default=None, help=f'Путь к манифесту, по умолчанию {MANIFEST_NAME} в каталоге видео')
+    parser.add_argument('--force', action='store_true', help='Обработать заново уже обработанные видео')
+    cli_args = parser.parse_args()
+    if not os.path.isdir(cli_args.video_dir):
+        print(f'Каталог не найден: {cli_args.video_dir}')
+        sys.exit(1)
+    result = run_batch(cli_args.video_dir, cli_args.workers, cli_args.manifest, cli_args.force)
+    sys.exit(1 if any(entry['status'] == STATUS_FAILED for entry in result['videos'].values()) else 0)
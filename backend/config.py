@@ -12,17 +12,8 @@ import os
 import re
 import time
 from pathlib import Path
-try:
-    # Для новой версии filesplit (>=4.0.0)
-    from filesplit.split import Split
-    from filesplit.merge import Merge
-    FILESPLIT_NEW_API = True
-except ImportError:
-    # Для старой версии filesplit (<4.0.0)
-    from fsplit.filesplit import Filesplit
-    FILESPLIT_NEW_API = False
-import paddle
 from tools.constant import *
+from tools import runtime
 
 # Версия проекта
 VERSION = "2.0.3"
@@ -30,6 +21,14 @@ VERSION = "2.0.3"
 # Базовый каталог проекта
 BASE_DIR = str(Path(os.path.abspath(__file__)).parent)
 
+# Параметры, зависящие от устройства выполнения и файлов моделей. Они вычисляются при первом обращении
+# (см. __getattr__ и _init_runtime), поэтому импорт config не импортирует paddle и не объединяет файлы моделей
+RUNTIME_NAMES = ('USE_GPU', 'ONNX_PROVIDERS', 'ACCURATE_MODE_ON', 'MODEL_VERSION', 'REC_IMAGE_SHAPE',
+                 'REC_MODEL_PATH', 'DET_MODEL_PATH')
+# При importlib.reload(config) значения, вычисленные для прежних настроек, сбрасываются
+for _name in RUNTIME_NAMES:
+    globals().pop(_name, None)
+
 # ×××××××××××××××××××× [НЕ ИЗМЕНЯТЬ] Чтение конфигурационных файлов start ××××××××××××××××××××
 # Чтение settings.ini
 settings_config = configparser.ConfigParser()
@@ -78,67 +77,12 @@ while not IS_LEGAL_PATH:
 # ×××××××××××××××××××× [НЕ ИЗМЕНЯТЬ] Проверка корректности пути запуска программы end ××××××××××××××××××××
 
 
-# ×××××××××××××××××××× [НЕ ИЗМЕНЯТЬ] Определение использования GPU start ××××××××××××××××××××
-# Использовать ли GPU (Nvidia)
-USE_GPU = False
-# Если paddlepaddle скомпилирован с поддержкой GPU
-if paddle.is_compiled_with_cuda():
-    # Проверить доступность GPU
-    if len(paddle.static.cuda_places()) > 0:
-        # Если есть GPU, использовать GPU
-        USE_GPU = True
-
-# Использовать ли ONNX (DirectML/AMD/Intel)
-ONNX_PROVIDERS = []
-if USE_GPU == False:
-    try:
-        import onnxruntime as ort
-        available_providers = ort.get_available_providers()
-        for provider in available_providers:
-            if provider in [
-                "CPUExecutionProvider"
-            ]:
-                continue
-            if provider not in [
-                "DmlExecutionProvider",         # DirectML, для Windows GPU
-                "ROCMExecutionProvider",        # AMD ROCm
-                "MIGraphXExecutionProvider",    # AMD MIGraphX
-                # "VitisAIExecutionProvider",   # AMD VitisAI, для RyzenAI & Windows
-                "OpenVINOExecutionProvider",    # Intel GPU
-                "MetalExecutionProvider",       # Apple macOS
-                "CoreMLExecutionProvider",      # Apple macOS
-                "CUDAExecutionProvider",        # Nvidia GPU
-            ]:
-                print(interface_config['Main']['OnnxExectionProviderNotSupportedSkipped'].format(provider))
-                continue
-            print(interface_config['Main']['OnnxExecutionProviderDetected'].format(provider))
-            ONNX_PROVIDERS.append(provider)
-    except ModuleNotFoundError as e:
-        print(interface_config['Main']['OnnxRuntimeNotInstall'])
-if len(ONNX_PROVIDERS) > 0:
-    USE_GPU = True
-# ×××××××××××××××××××× [НЕ ИЗМЕНЯТЬ] Определение использования GPU end ××××××××××××××××××××
-
-
 # ×××××××××××××××××××× [НЕ ИЗМЕНЯТЬ] Чтение языка, пути модели, пути словаря start ××××××××××××××××××××
 # Установка языка распознавания
 REC_CHAR_TYPE = settings_config['DEFAULT']['Language']
 
 # Установка режима распознавания
 MODE_TYPE = settings_config['DEFAULT']['Mode']
-ACCURATE_MODE_ON = False
-if MODE_TYPE == 'accurate':
-    ACCURATE_MODE_ON = True
-if MODE_TYPE == 'fast':
-    ACCURATE_MODE_ON = False
-if MODE_TYPE == 'auto':
-    if USE_GPU:
-        ACCURATE_MODE_ON = True
-    else:
-        ACCURATE_MODE_ON = False
-# Каталог файлов модели
-# Версия модели по умолчанию V4
-MODEL_VERSION = 'V4'
 # Модель детектирования текста
 DET_MODEL_BASE = os.path.join(BASE_DIR, 'models')
 # Установка модели распознавания текста + словарь
@@ -149,11 +93,6 @@ DICT_PATH = os.path.join(BASE_DIR, 'ppocr', 'utils', 'dict', f'{REC_CHAR_TYPE}_d
 # Если файл словаря не существует, используем английский словарь по умолчанию
 if not os.path.exists(DICT_PATH) and REC_CHAR_TYPE != 'en':
     DICT_PATH = os.path.join(BASE_DIR, 'ppocr', 'utils', 'dict', 'en_dict.txt')
-    
-# V3, V4 модели по умолчанию shape распознавания изображения 3, 48, 320
-REC_IMAGE_SHAPE = '3,48,320'
-REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_det')
 
 LATIN_LANG = [
     'af', 'az', 'bs', 'cs', 'cy', 'da', 'de', 'es', 'et', 'fr', 'ga', 'hr',
@@ -177,75 +116,123 @@ OTHER_LANG = [
 MULTI_LANG = LATIN_LANG + ARABIC_LANG + CYRILLIC_LANG + DEVANAGARI_LANG + \
              OTHER_LANG
 
-DET_MODEL_FAST_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-
-
-# Если установлен тип языка распознавания текста, установить соответствующий язык
-if REC_CHAR_TYPE in MULTI_LANG:
-    # Определение модели детектирования и распознавания текста
-    # При использовании быстрого режима, использовать легковесную модель
+# Каталог файлов модели
+# Версия модели по умолчанию V4
+DEFAULT_MODEL_VERSION = 'V4'
+DET_MODEL_FAST_PATH = os.path.join(DET_MODEL_BASE, DEFAULT_MODEL_VERSION, 'ch_det_fast')
+
+
+def _init_runtime():
+    """
+    Определение использования GPU, выбор и подготовка файлов моделей.
+    Выполняется при первом обращении к одному из параметров RUNTIME_NAMES
+    """
+    global USE_GPU, ONNX_PROVIDERS, ACCURATE_MODE_ON, MODEL_VERSION, REC_IMAGE_SHAPE, REC_MODEL_PATH, DET_MODEL_PATH
+    # Использовать ли GPU (Nvidia)
+    use_gpu = runtime.cuda_available()
+    # Использовать ли ONNX (DirectML/AMD/Intel)
+    onnx_providers = []
+    if not use_gpu:
+        providers = runtime.onnx_providers()
+        if providers is None:
+            print(interface_config['Main']['OnnxRuntimeNotInstall'])
+        else:
+            onnx_providers, skipped_providers = providers
+            for provider in skipped_providers:
+                print(interface_config['Main']['OnnxExectionProviderNotSupportedSkipped'].format(provider))
+            for provider in onnx_providers:
+                print(interface_config['Main']['OnnxExecutionProviderDetected'].format(provider))
+    if len(onnx_providers) > 0:
+        use_gpu = True
+
+    accurate_mode_on = False
+    if MODE_TYPE == 'accurate':
+        accurate_mode_on = True
     if MODE_TYPE == 'fast':
-        DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    # При использовании автоматического режима, определить использование GPU для выбора модели
-    elif MODE_TYPE == 'auto':
-        # Если используется GPU, использовать большую модель
-        if USE_GPU:
-            DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
-            # Для английского режима модель ch распознает лучше, чем fast
-            if REC_CHAR_TYPE == 'en':
-                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'ch_rec')
-            else:
-                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
+        accurate_mode_on = False
+    if MODE_TYPE == 'auto':
+        if use_gpu:
+            accurate_mode_on = True
         else:
-            DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-            REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    else:
-        DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-    # Если в версии по умолчанию (V4) нет большой модели, переключиться на fast модель версии по умолчанию (V4)
-    if not os.path.exists(REC_MODEL_PATH):
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    # Если в версии по умолчанию (V4) нет ни большой модели, ни fast модели, использовать большую модель версии V3
-    if not os.path.exists(REC_MODEL_PATH):
-        MODEL_VERSION = 'V3'
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-    # Если в версии V3 нет большой модели, использовать fast модель версии V3
-    if not os.path.exists(REC_MODEL_PATH):
-        MODEL_VERSION = 'V3'
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-
-    if REC_CHAR_TYPE in LATIN_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'latin_rec_fast')
-    elif REC_CHAR_TYPE in ARABIC_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'arabic_rec_fast')
-    elif REC_CHAR_TYPE in CYRILLIC_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'cyrillic_rec_fast')
-    elif REC_CHAR_TYPE in DEVANAGARI_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'devanagari_rec_fast')
-
-    # Определение shape распознавания изображения
-    if MODEL_VERSION == 'V2':
-        REC_IMAGE_SHAPE = '3,32,320'
-    else:
-        REC_IMAGE_SHAPE = '3,48,320'
-
-    # Проверить, есть ли полный файл модели распознавания текста в этом пути, если нет, объединить мелкие файлы для создания полного файла
-    if 'inference.pdiparams' not in (os.listdir(REC_MODEL_PATH)):
-        if FILESPLIT_NEW_API:
-            merge = Merge(inputdir=REC_MODEL_PATH, outputdir=REC_MODEL_PATH, outputfilename='merged_file')
-            merge.merge()
+            accurate_mode_on = False
+
+    model_version = DEFAULT_MODEL_VERSION
+    # V3, V4 модели по умолчанию shape распознавания изображения 3, 48, 320
+    rec_image_shape = '3,48,320'
+    rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec')
+    det_model_path = os.path.join(DET_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_det')
+
+    # Если установлен тип языка распознавания текста, установить соответствующий язык
+    if REC_CHAR_TYPE in MULTI_LANG:
+        # Определение модели детектирования и распознавания текста
+        # При использовании быстрого режима, использовать легковесную модель
+        if MODE_TYPE == 'fast':
+            det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det_fast')
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec_fast')
+        # При использовании автоматического режима, определить использование GPU для выбора модели
+        elif MODE_TYPE == 'auto':
+            # Если используется GPU, использовать большую модель
+            if use_gpu:
+                det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det')
+                # Для английского режима модель ch распознает лучше, чем fast
+                if REC_CHAR_TYPE == 'en':
+                    rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'ch_rec')
+                else:
+                    rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec')
+            else:
+                det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det_fast')
+                rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec_fast')
         else:
-            fs = Filesplit()
-            fs.merge(input_dir=REC_MODEL_PATH)
-    # Проверить, есть ли полный файл модели распознавания текста в этом пути, если нет, объединить мелкие файлы для создания полного файла
-    if 'inference.pdiparams' not in (os.listdir(DET_MODEL_PATH)):
-        if FILESPLIT_NEW_API:
-            merge = Merge(inputdir=DET_MODEL_PATH, outputdir=DET_MODEL_PATH, outputfilename='merged_file')
-            merge.merge()
+            det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det')
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec')
+        # Если в версии по умолчанию (V4) нет большой модели, переключиться на fast модель версии по умолчанию (V4)
+        if not os.path.exists(rec_model_path):
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec_fast')
+        # Если в версии по умолчанию (V4) нет ни большой модели, ни fast модели, использовать большую модель версии V3
+        if not os.path.exists(rec_model_path):
+            model_version = 'V3'
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec')
+        # Если в версии V3 нет большой модели, использовать fast модель версии V3
+        if not os.path.exists(rec_model_path):
+            model_version = 'V3'
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{REC_CHAR_TYPE}_rec_fast')
+
+        if REC_CHAR_TYPE in LATIN_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'latin_rec_fast')
+        elif REC_CHAR_TYPE in ARABIC_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'arabic_rec_fast')
+        elif REC_CHAR_TYPE in CYRILLIC_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'cyrillic_rec_fast')
+        elif REC_CHAR_TYPE in DEVANAGARI_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'devanagari_rec_fast')
+
+        # Определение shape распознавания изображения
+        if model_version == 'V2':
+            rec_image_shape = '3,32,320'
         else:
-            fs = Filesplit()
-            fs.merge(input_dir=DET_MODEL_PATH)
+            rec_image_shape = '3,48,320'
+
+        # Если в каталоге модели нет полного файла параметров, объединить мелкие файлы (один раз, см. runtime.merge_model)
+        runtime.merge_model(rec_model_path)
+        runtime.merge_model(det_model_path)
+
+    USE_GPU = use_gpu
+    ONNX_PROVIDERS = onnx_providers
+    ACCURATE_MODE_ON = accurate_mode_on
+    MODEL_VERSION = model_version
+    REC_IMAGE_SHAPE = rec_image_shape
+    REC_MODEL_PATH = rec_model_path
+    DET_MODEL_PATH = det_model_path
+
+
+def __getattr__(name):
+    """
+    Ленивое вычисление параметров RUNTIME_NAMES при первом обращении
+    """
+    if name in RUNTIME_NAMES:
+        _init_runtime()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 # ×××××××××××××××××××× [НЕ ИЗМЕНЯТЬ] Чтение языка, пути модели, пути словаря end ××××××××××××××××××××
 
 
@@ -258,12 +245,78 @@ REC_BATCH_NUM = 6
 # DB алгоритм распознает сколько изображений в каждом batch, по умолчанию 10
 MAX_BATCH_SIZE = 10
 
+# Процесс OCR накапливает до OCR_BATCH_SIZE кадров (или ждет не более OCR_BATCH_TIMEOUT секунд)
+# и распознает текстовые строки всех накопленных кадров за один вызов модели распознавания
+OCR_BATCH_SIZE = 16
+OCR_BATCH_TIMEOUT = 0.2
+
 # Область появления субтитров по умолчанию - нижняя
 DEFAULT_SUBTITLE_AREA = SubtitleArea.UNKNOWN
 
 # Сколько кадров в секунду захватывать для распознавания OCR
 EXTRACT_FREQUENCY = 3
 
+# Бэкенд декодирования видео: 'opencv' - FFmpeg через OpenCV, 'pyav' - PyAV (требуется pip install av)
+DECODER_BACKEND = 'opencv'
+# Количество потоков декодирования, 0 - по количеству ядер процессора
+DECODER_THREADS = 0
+# Декодировать при извлечении по кадрам только ключевые кадры (только для 'pyav'): многократно быстрее,
+# но кадры выбираются с шагом между ключевыми кадрами видео, а не с частотой EXTRACT_FREQUENCY
+DECODER_KEYFRAMES_ONLY = False
+
+# Уточнять ли границы субтитров бинарным поиском: кадры выбираются с шагом BISECT_COARSE_INTERVAL секунд,
+# а точный кадр смены текста ищется бинарным поиском. Дает точность до кадра при меньшем количестве OCR,
+# но требует позиционирования видео, поэтому эффективен для длинных статичных субтитров
+BOUNDARY_BISECT = False
+# Шаг грубой выборки кадров в секундах для режима бинарного поиска
+BISECT_COARSE_INTERVAL = 1.5
+
+# Передавать ли кадры, декодированные в основном процессе, в процесс OCR через разделяемую память (видео декодируется только один раз)
+STREAM_FRAMES = True
+# Количество слотов кольцевого буфера кадров в разделяемой памяти, при заполнении буфера извлечение кадров ждет процесс OCR
+FRAME_RING_SLOTS = 8
+
+# Количество процессов параллельного извлечения по кадрам: видео делится на фрагменты, каждый фрагмент декодируется
+# и распознается в отдельном процессе (каждый процесс загружает собственные модели), 1 - последовательное извлечение
+CHUNK_PROCESS_NUM = 1
+# Перекрытие соседних фрагментов в секундах
+CHUNK_OVERLAP_SECONDS = 2
+
+# Количество процессов OCR, каждый процесс загружает собственную модель (только если ему нужно распознавать кадры)
+# 0 - автоматически: на GPU используется один процесс, на CPU - по одному процессу на каждые 4 ядра, но не более 8
+OCR_WORKER_NUM = 0
+
+# Размеры очередей конвейера OCR: задачи от извлечения кадров к процессам OCR, кадры внутри процесса OCR
+# и результаты к процессу записи. При заполнении очереди предыдущая стадия ждет следующую,
+# поэтому потребление памяти на длинных видео не растет. После OCR выводятся глубина очередей и время ожидания стадий
+TASK_QUEUE_SIZE = 64
+OCR_QUEUE_SIZE = 20
+RESULT_QUEUE_SIZE = 64
+
+# Постоянный кэш результатов OCR на диске (SQLite), ключ - хэш содержимого видео, пути моделей и область субтитров
+# Повторный запуск на том же видео (например, с другими THRESHOLD_TEXT_SIMILARITY или DROP_SCORE) не декодирует видео и не выполняет OCR заново
+# Кэш используется только основным процессом последовательного извлечения, процессы фрагментов и пакетной обработки его не открывают
+OCR_CACHE_ENABLE = False
+# Путь к файлу кэша в пользовательском каталоге кэша, кэш не удаляется вместе с временными файлами видео
+OCR_CACHE_PATH = os.path.join(os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME')
+                              or os.path.join(os.path.expanduser('~'), '.cache'),
+                              'video-subtitle-extractor', 'ocr_cache.sqlite3')
+# Максимальный размер кэша в байтах, при превышении удаляются данные давно не использованных видео
+OCR_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+
+# Интервал записи контрольных точек при извлечении по кадрам (в секундах), 0 - не записывать
+# После сбоя или прерывания извлечение продолжается с последней контрольной точки: python backend/main.py --resume
+CHECKPOINT_INTERVAL = 60
+
+# Предварительная проверка изменения области субтитров перед OCR при извлечении по кадрам
+# 'edge' - сравнение карт границ текста, 'gray' - сравнение уменьшенных изображений в градациях серого,
+# 'cosine', 'ssim', 'phash' - косинусное сходство, упрощенный SSIM, перцептивный хэш, None - всегда выполнять OCR
+# Изменение в один-два символа в широкой области субтитров может оказаться ниже порога, и новая строка будет объединена
+# с предыдущей, поэтому по умолчанию проверка выключена
+FRAME_DIFF_MODE = None
+# Порог изменения (доля от 0 до 1), ниже которого считается, что субтитры не изменились и OCR не выполняется
+FRAME_DIFF_THRESHOLD = 0.01
+
 # Допустимое отклонение пикселей
 PIXEL_TOLERANCE_Y = 50  # Допускается продольное отклонение рамки детектирования на 50 пикселей
 PIXEL_TOLERANCE_X = 100  # Допускается горизонтальное отклонение рамки детектирования на 100 пикселей
@@ -271,6 +324,22 @@ PIXEL_TOLERANCE_X = 100  # Допускается горизонтальное 
 # Смещение области субтитров
 SUBTITLE_AREA_DEVIATION_PIXEL = 50
 
+# Если область субтитров указана, перед OCR кадр обрезается до этой области с запасом в указанное количество пикселей,
+# детектирование и распознавание выполняются только на обрезанной части кадра
+SUB_AREA_CROP_MARGIN_PIXEL = 32
+
+# Адаптивное уменьшение разрешения изображения перед OCR (видео 4K и другого высокого разрешения)
+# Изображение уменьшается так, чтобы высота текста была не меньше OCR_TARGET_TEXT_HEIGHT пикселей,
+# но не сильнее, чем до OCR_MAX_INPUT_SIDE пикселей по большей стороне (размер входа модели детектирования)
+# Координаты результата пересчитываются в систему координат исходного кадра, None - не уменьшать
+OCR_TARGET_TEXT_HEIGHT = 48
+OCR_MAX_INPUT_SIDE = 960
+# Высота строки субтитров относительно высоты кадра, по ней оценивается высота текста (она не измеряется по кадрам,
+# чтобы результат OCR кадра не зависел от предыдущих кадров). 0.04 - обычные субтитры: видео до 1080p не уменьшается,
+# кадр 4K уменьшается до 0.6 размера. Для мелких субтитров уменьшите значение (например, 0.02),
+# иначе текст будет уменьшен ниже OCR_TARGET_TEXT_HEIGHT и распознается хуже
+OCR_EXPECTED_TEXT_HEIGHT_RATIO = 0.04
+
 # Наиболее вероятная область водяного знака
 WATERMARK_AREA_NUM = 5
 
@@ -279,6 +348,9 @@ WATERMARK_AREA_NUM = 5
 # Используется динамический алгоритм для определения порога схожести текста: для короткого текста требуется более низкий порог, для длинного текста - более высокий
 # Например: для короткого текста "народ", "народ", 0.5 считается схожим
 THRESHOLD_TEXT_SIMILARITY = 0.8
+# Окно сравнения при удалении дубликатов: количество непохожих строк подряд, через которые субтитр продолжается,
+# если за ними снова идет похожая строка (мерцание или ошибка распознавания на одном кадре: A-B-A), 0 - не пропускать
+DEDUP_WINDOW = 0
 
 # Уверенность в извлечении субтитров ниже 0.75 отбрасывается
 DROP_SCORE = 0.5
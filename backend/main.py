@@ -6,6 +6,7 @@
 @desc: Главный файл входа в программу
 """
 import os
+import argparse
 import random
 import shutil
 from collections import Counter, namedtuple
@@ -13,9 +14,8 @@ import unicodedata
 from threading import Thread
 from pathlib import Path
 import cv2
+import numpy as np
 from Levenshtein import ratio
-from PIL import Image
-from numpy import average, dot, linalg
 from tqdm import tqdm
 import sys
 
@@ -23,11 +23,21 @@ sys.path.insert(0, os.path.dirname(__file__))
 import importlib
 import config
 from tools import reformat
-from tools.infer import utility
-from tools.infer.predict_det import TextDetector
 from tools.ocr import OcrRecogniser, get_coordinates
 from tools import subtitle_ocr
+from tools.frame_buffer import SharedFrameRing
+from tools import roi
+from tools import box_utils
+from tools.dedup import SubtitleDeduplicator
+from tools import decoder
+from tools import model_registry
+from tools import runtime
+from tools import similarity
+from tools.similarity import FrameChangeDetector
+from tools.raw_store import RawSubtitleStore, most_common_rows
+from tools.ocr_cache import OcrResultCache, file_fingerprint, make_key, encode_result, decode_result
 import threading
+import queue
 import platform
 import multiprocessing
 import time
@@ -40,12 +50,8 @@ class SubtitleDetect:
     """
 
     def __init__(self):
-        # Получение объекта параметров
-        importlib.reload(config)
-        args = utility.parse_args()
-        args.det_algorithm = 'DB'
-        args.det_model_dir = config.DET_MODEL_PATH
-        self.text_detector = TextDetector(args)
+        # Модель загружается один раз на процесс для каждого каталога модели
+        self.text_detector = model_registry.get_text_detector(config.DET_MODEL_PATH)
 
     def detect_subtitle(self, img):
         dt_boxes, elapse = self.text_detector(img)
@@ -57,17 +63,18 @@ class SubtitleExtractor:
     Класс извлечения субтитров из видео
     """
 
-    def __init__(self, vd_path, sub_area=None, gui_mode=False):
+    def __init__(self, vd_path, sub_area=None, gui_mode=False, resume=False, interactive=True, inline_ocr=False,
+                 use_ocr_cache=True):
         importlib.reload(config)
         # Блокировка потока
         self.lock = threading.RLock()
         # Позиция области субтитров, указанная пользователем
         self.sub_area = sub_area
-        # Создание объекта детектирования субтитров
-        self.sub_detector = SubtitleDetect()
+        # Объект детектирования субтитров создается при первом обращении (нужен только для extract_frame_by_det)
+        self._sub_detector = None
         # Путь к видео
         self.video_path = vd_path
-        self.video_cap = cv2.VideoCapture(vd_path)
+        self.video_cap = self._open_video()
         # Получение названия видео из пути
         self.vd_name = Path(self.video_path).stem
         # Временная папка для хранения
@@ -81,9 +88,19 @@ class SubtitleExtractor:
         self.frame_count = self.video_cap.get(cv2.CAP_PROP_FRAME_COUNT)
         # Частота кадров видео (FPS)
         self.fps = self.video_cap.get(cv2.CAP_PROP_FPS)
+        # Индекс временных меток кадров (мс), заполняется во время декодирования, -1 - временная метка неизвестна
+        self.frame_pts = np.full(max(int(self.frame_count), 0) + 1, -1, dtype=np.float64)
         # Размеры видео
         self.frame_height = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         self.frame_width = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        # Область кадра, передаваемая в OCR: область субтитров с запасом, None - весь кадр
+        self.ocr_region = roi.get_crop_region(sub_area, self.frame_height, self.frame_width,
+                                              config.SUB_AREA_CROP_MARGIN_PIXEL)
+        # Адаптивное уменьшение разрешения изображения перед OCR по высоте текста, оцененной по высоте кадра
+        self.ocr_scaler = None
+        if config.OCR_TARGET_TEXT_HEIGHT is not None:
+            self.ocr_scaler = roi.AdaptiveScaler(config.OCR_TARGET_TEXT_HEIGHT, config.OCR_MAX_INPUT_SIDE,
+                                                 self.frame_height, config.OCR_EXPECTED_TEXT_HEIGHT_RATIO)
         # Область появления субтитров по умолчанию, если пользователь не указал
         self.default_subtitle_area = config.DEFAULT_SUBTITLE_AREA
         # Директория для хранения извлеченных кадров видео
@@ -101,8 +118,40 @@ class SubtitleExtractor:
         self.vsf_subtitle = os.path.join(self.subtitle_output_dir, 'raw_vsf.srt')
         # Путь хранения исходного текста субтитров
         self.raw_subtitle_path = os.path.join(self.subtitle_output_dir, 'raw.txt')
+        # Сырые субтитры в памяти, raw.txt читается один раз после извлечения, дальнейшая обработка выполняется над массивами
+        self.raw_store = None
+        # Продолжать ли извлечение с последней контрольной точки
+        self.resume = resume
+        # Загруженная контрольная точка (смещение в raw.txt, состояние извлечения)
+        self.resume_checkpoint = None
+        # Путь хранения индекса временных меток кадров на момент контрольной точки
+        self.frame_pts_path = os.path.join(self.subtitle_output_dir, 'frame_pts.npy')
         # Пользовательский объект OCR
         self.ocr = None
+        # Кольцевой буфер кадров в разделяемой памяти для передачи декодированных кадров в процесс OCR
+        self.frame_ring = None
+        # Постоянный кэш результатов OCR, ключ - хэш содержимого видео, пути моделей и область субтитров
+        # Процессы фрагментов и пакетной обработки кэш не открывают (use_ocr_cache=False): в общий файл SQLite пишет только один процесс
+        self.ocr_cache = None
+        if config.OCR_CACHE_ENABLE and use_ocr_cache and os.path.isfile(vd_path):
+            self.ocr_cache = OcrResultCache(config.OCR_CACHE_PATH,
+                                            make_key(file_fingerprint(vd_path), config.DET_MODEL_PATH,
+                                                     config.REC_MODEL_PATH, sub_area,
+                                                     config.SUB_AREA_CROP_MARGIN_PIXEL, config.OCR_TARGET_TEXT_HEIGHT,
+                                                     config.OCR_MAX_INPUT_SIDE, config.OCR_EXPECTED_TEXT_HEIGHT_RATIO),
+                                            config.OCR_CACHE_MAX_SIZE)
+        # Счетчик OCR распознаваний по номеру кадра, каждый кадр должен распознаваться не более одного раза
+        self.ocr_predict_counter = Counter()
+        # Детектор изменения области субтитров: OCR выполняется только если область изменилась с последнего распознанного кадра
+        self.change_detector = None
+        if config.FRAME_DIFF_MODE is not None:
+            self.change_detector = FrameChangeDetector(config.FRAME_DIFF_THRESHOLD, config.FRAME_DIFF_MODE)
+        # Результат последнего распознанного кадра
+        self.last_ocr_result = None
+        # Выбранные кадры записанного прохода {номер кадра: номер кадра, результат OCR которого использован}, видео не декодируется
+        self.replay_samples = None
+        # Количество кадров, для которых OCR пропущено, так как область субтитров не изменилась
+        self.ocr_skip_count = 0
         # Вывод языка распознавания и режима распознавания
         print(f"{config.interface_config['Main']['RecSubLang']}：{config.REC_CHAR_TYPE}")
         print(f"{config.interface_config['Main']['RecMode']}：{config.MODE_TYPE}")
@@ -119,12 +168,21 @@ class SubtitleExtractor:
         self.isFinished = False
         # Очередь задач OCR субтитров
         self.subtitle_ocr_task_queue = None
+        # Процессы OCR, состояние которых проверяется, пока основной процесс ждет места в очередях
+        self.subtitle_ocr_pool = None
         # Очередь прогресса OCR субтитров
         self.subtitle_ocr_progress_queue = None
         # Статус выполнения VSF
         self.vsf_running = False
         # Флаг режима GUI
         self.gui_mode = gui_mode
+        # Запрашивать ли подтверждение пользователя при фильтрации водяных знаков и текста сцены
+        # Без запроса фильтрация водяных знаков пропускается, а область субтитров принимается автоматически
+        self.interactive = interactive
+        # Обрабатывать ли задачи OCR в текущем процессе без запуска процессов OCR (пакетная обработка в пуле процессов)
+        self.inline_ocr = inline_ocr
+        # Позиция индикатора прогресса извлечения кадров (у каждого процесса извлечения фрагмента своя строка)
+        self.progress_position = 0
 
     def run(self):
         """
@@ -158,47 +216,48 @@ class SubtitleExtractor:
             if hasattr(self, 'vsf_failed') and self.vsf_failed:
                 print("VSF недоступен, используем метод извлечения по кадрам")
                 self.sub_area = None  # Отключаем указание области для использования метода по кадрам
+                self.ocr_region = None
         
         print(config.interface_config['Main']['StartProcessFrame'])
-        
-        # Создаем процесс OCR распознавания субтитров
-        subtitle_ocr_process = self.start_subtitle_ocr_async()
-        
-        # Выбор метода извлечения кадров
-        if self.sub_area is not None:
-            if platform.system() in ['Windows', 'Linux']:
-                # Пробуем использовать VSF
-                try:
-                    self.extract_frame_by_vsf()
-                    # Проверяем, создал ли VSF файлы
-                    if self.use_vsf and os.path.exists(self.vsf_subtitle):
-                        with open(self.vsf_subtitle, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            if len(content.strip()) == 0:
-                                print("VSF создал пустой файл, переключаюсь на метод по кадрам")
-                                self.use_vsf = False
-                                self.extract_frame_by_fps()
-                    elif self.use_vsf:
-                        print("VSF не создал файл субтитров, переключаюсь на метод по кадрам")
-                        self.use_vsf = False
-                        self.extract_frame_by_fps()
-                except Exception as e:
-                    print(f"Ошибка при использовании VSF: {e}")
-                    print("Переключаюсь на метод извлечения по кадрам")
-                    self.use_vsf = False
-                    self.extract_frame_by_fps()
+
+        # Продолжение с последней контрольной точки
+        if self.resume:
+            self.resume_checkpoint = subtitle_ocr.load_checkpoint(self.raw_subtitle_path)
+            if self.resume_checkpoint is None:
+                print('Контрольная точка не найдена, извлечение начинается сначала')
             else:
-                # Для других систем используем метод по кадрам
-                self.extract_frame_by_fps()
-        else:
-            # Если область субтитров не указана, используем метод по кадрам
-            self.extract_frame_by_fps()
+                print(f"Продолжение с контрольной точки: кадр {self.resume_checkpoint[1]['frame_no']}")
         
-        # Отправляем сигнал завершения в очередь задач OCR
-        self.subtitle_ocr_task_queue.put((self.frame_count, -1, None, None, None, None))
+        # Параллельное извлечение по кадрам несколькими процессами, если видео извлекается по кадрам
+        use_chunks = config.CHUNK_PROCESS_NUM > 1 and self.resume_checkpoint is None and not config.BOUNDARY_BISECT \
+            and not self.inline_ocr and (self.sub_area is None or platform.system() not in ['Windows', 'Linux'])
+        if use_chunks:
+            self.extract_frame_by_chunks()
+        else:
+            # Создаем процесс OCR распознавания субтитров
+            subtitle_ocr_process = self.start_subtitle_ocr_async()
         
-        # Ожидаем завершения процесса OCR
-        subtitle_ocr_process.join()
+            try:
+                self._extract_frames()
+                # Отправляем сигнал завершения в очередь задач OCR
+                self._put_ocr_task(-1)
+                # Ожидаем завершения процесса OCR
+                subtitle_ocr_process.join()
+            except BaseException:
+                # Процессы OCR завершились с ошибкой или извлечение прервано: процессы останавливаются, а не ожидаются бесконечно
+                subtitle_ocr_process.terminate()
+                raise
+            finally:
+                self.subtitle_ocr_pool = None
+                if self.frame_ring is not None:
+                    self.frame_ring.unlink()
+                    self.frame_ring = None
+            subtitle_ocr_process.print_metrics()
+            subtitle_ocr_process.raise_for_error()
+        if self.ocr_cache is not None:
+            self.ocr_cache.evict()
+            self.ocr_cache.close()
+            self.ocr_cache = None
         
         print(config.interface_config['Main']['FinishProcessFrame'])
         print(config.interface_config['Main']['FinishFindSub'])
@@ -210,9 +269,10 @@ class SubtitleExtractor:
             print("Попробуйте указать другую область субтитров.")
             self.lock.release()
             return
+        self.raw_store = RawSubtitleStore.load(self.raw_subtitle_path)
         
         # Вопрос о водяных знаках (только если область не указана)
-        if self.sub_area is None:
+        if self.sub_area is None and self.interactive:
             print(config.interface_config['Main']['StartDetectWaterMark'])
             user_input = input(config.interface_config['Main']['checkWaterMark']).strip()
             if user_input == 'y':
@@ -234,6 +294,9 @@ class SubtitleExtractor:
             self.generate_subtitle_file_vsf()
         else:
             self.generate_subtitle_file()
+        # Сохранение обработанных сырых субтитров для отладки
+        if config.DEBUG_NO_DELETE_CACHE:
+            self.raw_store.save(os.path.join(self.subtitle_output_dir, 'raw.npz'))
         
         if config.WORD_SEGMENTATION:
             reformat.execute(os.path.join(os.path.splitext(self.video_path)[0] + '.srt'), config.REC_CHAR_TYPE)
@@ -263,6 +326,43 @@ class SubtitleExtractor:
         if config.GENERATE_TXT:
             self.srt2txt(srt_file)
 
+    def _extract_frames(self):
+        """
+        Извлечение кадров выбранным методом, задачи OCR передаются в процессы OCR
+        """
+        # Выбор метода извлечения кадров
+        if self.resume_checkpoint is not None:
+            # Контрольные точки записывает только извлечение по кадрам
+            self.extract_frame_by_fps()
+        elif self.sub_area is not None:
+            if platform.system() in ['Windows', 'Linux']:
+                # Пробуем использовать VSF
+                try:
+                    self.extract_frame_by_vsf()
+                    # Проверяем, создал ли VSF файлы
+                    if self.use_vsf and os.path.exists(self.vsf_subtitle):
+                        with open(self.vsf_subtitle, 'r', encoding='utf-8') as f:
+                            content = f.read()
+                            if len(content.strip()) == 0:
+                                print("VSF создал пустой файл, переключаюсь на метод по кадрам")
+                                self.use_vsf = False
+                                self.extract_frame_by_fps()
+                    elif self.use_vsf:
+                        print("VSF не создал файл субтитров, переключаюсь на метод по кадрам")
+                        self.use_vsf = False
+                        self.extract_frame_by_fps()
+                except Exception as e:
+                    print(f"Ошибка при использовании VSF: {e}")
+                    print("Переключаюсь на метод извлечения по кадрам")
+                    self.use_vsf = False
+                    self.extract_frame_by_fps()
+            else:
+                # Для других систем используем метод по кадрам
+                self.extract_frame_by_fps()
+        else:
+            # Если область субтитров не указана, используем метод по кадрам
+            self.extract_frame_by_fps()
+
     def extract_frame_by_vsf(self):
         """
         Извлечение субтитровых кадров через вызов VideoSubFinder
@@ -282,8 +382,7 @@ class SubtitleExtractor:
                         total_ms = int(ms) + int(s) * 1000 + int(m) * 60 * 1000 + int(h) * 60 * 60 * 1000
                         if total_ms > last_total_ms:
                             frame_no = int(total_ms / self.fps)
-                            task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area)
-                            self.subtitle_ocr_task_queue.put(task)
+                            self._put_ocr_task(frame_no, total_ms=total_ms)
                         last_total_ms = total_ms
                         if total_ms / duration_ms >= 1:
                             self.update_progress(frame_extract=100)
@@ -404,115 +503,324 @@ class SubtitleExtractor:
         
         self.vsf_running = False
 
-    def extract_frame_by_fps(self):
+    def extract_frame_by_fps(self, begin_frame_no=0, end_frame_no=None):
         """
         Извлечение кадров по частоте X кадров в секунду
+        :param begin_frame_no, end_frame_no обрабатываются кадры с номерами от begin_frame_no + 1 до end_frame_no
+               (при параллельном извлечении фрагментами), по умолчанию - все видео
         """
+        # Режим уточнения границ субтитров бинарным поиском
+        if config.BOUNDARY_BISECT and self.resume_checkpoint is None:
+            self.extract_frame_by_bisect()
+            return
         # Удаление кэша
         self.__delete_frame_cache()
 
-        # Номер текущего кадра видео
-        current_frame_no = 0
         frame_lru_list = []
         frame_lru_list_max_size = 2
         ocr_args_list = []
         compare_ocr_result_cache = {}
-        tbar = tqdm(total=int(self.frame_count), unit='f', position=0, file=sys.__stdout__)
-        first_flag = True
-        is_finding_start_frame_no = False
+        # Проход с теми же параметрами выборки уже записан в кэше: видео не декодируется, результаты OCR берутся из кэша
+        run_key = make_key(config.EXTRACT_FREQUENCY, config.FRAME_DIFF_MODE, config.FRAME_DIFF_THRESHOLD, self.sub_area,
+                           config.DECODER_KEYFRAMES_ONLY)
+        # Записывается и воспроизводится только полный проход по видео
+        full_pass = self.resume_checkpoint is None and begin_frame_no == 0 and end_frame_no is None
+        replay = None
+        if self.ocr_cache is not None and full_pass:
+            replay = self.ocr_cache.load_pass(run_key)
+            # Проход воспроизводится, только если в кэше остались результаты всех использованных в нем кадров
+            if replay is not None and not self.ocr_cache.has_frames({source_no for _, source_no in replay[0]}):
+                replay = None
+        # Выбранные кадры прохода: [номер кадра, номер кадра, результат OCR которого использован]
+        samples = []
+        if replay is not None:
+            print('Результаты OCR найдены в кэше, видео не декодируется')
+            samples, pts = replay
+            self.frame_pts = np.frombuffer(pts, dtype=np.float64).copy()
+            self.replay_samples = dict(samples)
+        # При извлечении по частоте кадров каждый выбранный кадр считается кадром с субтитрами,
+        # поэтому первый же выбранный кадр является начальным
+        is_finding_start_frame_no = True
         is_finding_end_frame_no = False
         start_frame_no = 0
         start_end_frame_no = []
         start_frame = None
-        if self.ocr is None:
-            self.ocr = OcrRecogniser()
-        while self.video_cap.isOpened():
-            ret, frame = self.video_cap.read()
-            # Если чтение кадра не удалось (конец видео)
-            if not ret:
-                break
-            # Успешное чтение кадра
-            current_frame_no += 1
-            tbar.update(1)
-            # X кадров в секунду
-            if current_frame_no % int(self.fps / config.EXTRACT_FREQUENCY) == 0:
-                # По умолчанию предполагаем наличие субтитров
-                has_subtitle = True
-                # Обнаружение начального и конечного номера кадра, содержащего субтитры
-                if has_subtitle:
-                    # Определяем, является ли кадр начальным или конечным
-                    if is_finding_start_frame_no:
-                        start_frame_no = current_frame_no
-                        dt_box, rec_res = self.ocr.predict(frame)
-                        area_text1 = "".join(self.__get_area_text((dt_box, rec_res)))
-                        if start_frame_no not in compare_ocr_result_cache.keys():
-                            compare_ocr_result_cache[current_frame_no] = {'text': area_text1, 'dt_box': dt_box, 'rec_res': rec_res}
-                            frame_lru_list.append((frame, current_frame_no))
-                            ocr_args_list.append((self.frame_count, current_frame_no))
-                            # Кэшируем начальный кадр
-                            start_frame = frame
-                        # Начинаем поиск конечного кадра
-                        is_finding_start_frame_no = False
-                        is_finding_end_frame_no = True
-                    # Определяем, является ли кадр последним
-                    if is_finding_end_frame_no and current_frame_no == self.frame_count:
-                        is_finding_end_frame_no = False
-                        is_finding_start_frame_no = False
-                        end_frame_no = current_frame_no
-                        frame_lru_list.append((frame, current_frame_no))
-                        ocr_args_list.append((self.frame_count, current_frame_no))
-                        start_end_frame_no.append((start_frame_no, end_frame_no))
-                    # Если находимся в поиске конечного кадра
-                    if is_finding_end_frame_no:
-                        # Проверяем, совпадает ли содержимое OCR этого кадра с начальным кадром. Если нет, то найден конечный кадр (предыдущий кадр)
-                        if not self._compare_ocr_result(compare_ocr_result_cache, None, start_frame_no, frame, current_frame_no):
-                            is_finding_end_frame_no = False
-                            is_finding_start_frame_no = True
-                            end_frame_no = current_frame_no - 1
-                            frame_lru_list.append((start_frame, end_frame_no))
-                            ocr_args_list.append((self.frame_count, end_frame_no))
-                            start_end_frame_no.append((start_frame_no, end_frame_no))
-
-                else:
-                    # Если после обнаружения начального кадра субтитров нет, то найден конечный кадр (предыдущий кадр)
-                    if is_finding_end_frame_no:
-                        end_frame_no = current_frame_no - 1
+        # Результат OCR начального кадра, передается в процесс OCR вместе с конечным кадром
+        start_result = None
+        self.last_ocr_result = None
+        if self.change_detector is not None:
+            self.change_detector.reset()
+        # Номер кадра, после которого начинается чтение видео
+        resume_frame_no = begin_frame_no
+        if self.resume_checkpoint is not None:
+            state = self.resume_checkpoint[1]
+            resume_frame_no = state['frame_no']
+            is_finding_start_frame_no = state['is_finding_start_frame_no']
+            is_finding_end_frame_no = state['is_finding_end_frame_no']
+            start_frame_no = state['start_frame_no']
+            if state['start_result'] is not None:
+                start_result = self._make_ocr_result(*decode_result(state['start_result'][1]), state['start_result'][0])
+                compare_ocr_result_cache[start_frame_no] = start_result
+            # Задачи, еще не переданные в процесс OCR на момент контрольной точки
+            for ocr_info_frame_no, result in state['pending']:
+                ocr_args_list.append((ocr_info_frame_no, *decode_result(result), None))
+            if os.path.exists(self.frame_pts_path):
+                frame_pts = np.load(self.frame_pts_path)
+                if len(frame_pts) == len(self.frame_pts):
+                    self.frame_pts = frame_pts
+        checkpoint_time = time.time()
+        for current_frame_no, frame in self._read_sampled_frames([no for no, _ in samples] if replay is not None else None,
+                                                                 resume_frame_no, end_frame_no):
+            # По умолчанию предполагаем наличие субтитров
+            has_subtitle = True
+            # Обнаружение начального и конечного номера кадра, содержащего субтитры
+            if has_subtitle:
+                # Определяем, является ли кадр начальным или конечным
+                if is_finding_start_frame_no:
+                    start_frame_no = current_frame_no
+                    start_result = self._predict_frame(compare_ocr_result_cache, frame, current_frame_no)
+                    frame_lru_list.append((frame, current_frame_no))
+                    ocr_args_list.append((current_frame_no, start_result['dt_box'], start_result['rec_res'], frame))
+                    # Кэшируем начальный кадр
+                    start_frame = frame
+                    # Начинаем поиск конечного кадра
+                    is_finding_start_frame_no = False
+                    is_finding_end_frame_no = True
+                # Определяем, является ли кадр последним
+                if is_finding_end_frame_no and current_frame_no == self.frame_count:
+                    is_finding_end_frame_no = False
+                    is_finding_start_frame_no = False
+                    end_frame_no = current_frame_no
+                    end_result = self._predict_frame(compare_ocr_result_cache, frame, current_frame_no)
+                    frame_lru_list.append((frame, current_frame_no))
+                    ocr_args_list.append((current_frame_no, end_result['dt_box'], end_result['rec_res'], frame))
+                    start_end_frame_no.append((start_frame_no, end_frame_no))
+                # Если находимся в поиске конечного кадра
+                if is_finding_end_frame_no:
+                    # Проверяем, совпадает ли содержимое OCR этого кадра с начальным кадром. Если нет, то найден конечный кадр (предыдущий кадр)
+                    if not self._compare_ocr_result(compare_ocr_result_cache, None, start_frame_no, frame, current_frame_no):
                         is_finding_end_frame_no = False
                         is_finding_start_frame_no = True
+                        end_frame_no = current_frame_no - 1
                         frame_lru_list.append((start_frame, end_frame_no))
-                        ocr_args_list.append((self.frame_count, end_frame_no))
+                        # Конечный кадр содержит тот же текст, что и начальный, поэтому передаем результат начального кадра
+                        ocr_args_list.append((end_frame_no, start_result['dt_box'], start_result['rec_res'], start_frame))
                         start_end_frame_no.append((start_frame_no, end_frame_no))
+            if replay is None:
+                samples.append([current_frame_no, compare_ocr_result_cache[current_frame_no]['frame_no']])
 
-                while len(frame_lru_list) > frame_lru_list_max_size:
-                    frame_lru_list.pop(0)
+            while len(frame_lru_list) > frame_lru_list_max_size:
+                frame_lru_list.pop(0)
 
-                # if len(start_end_frame_no) > 0:
-                    # print(start_end_frame_no)
+            while len(ocr_args_list) > 1:
+                ocr_info_frame_no, dt_box, rec_res, ocr_frame = ocr_args_list.pop(0)
+                self._put_ocr_task(ocr_info_frame_no, dt_box, rec_res, frame=ocr_frame)
+                self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
 
-                while len(ocr_args_list) > 1:
-                    total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
-                    if current_frame_no in compare_ocr_result_cache:
-                        predict_result = compare_ocr_result_cache[current_frame_no]
-                        dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
-                    else:
-                        dt_box, rec_res = None, None
-                    # subtitle_ocr_task_queue: (total_frame_count общее количество кадров, current_frame_no текущий кадр, dt_box ограничивающая рамка, rec_res результат распознавания, время текущего кадра, subtitle_area область субтитров)
-                    task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
-                    # Добавление задачи
-                    self.subtitle_ocr_task_queue.put(task)
-                    self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
+            # Периодическая контрольная точка: все выбранные кадры до current_frame_no обработаны
+            if config.CHECKPOINT_INTERVAL > 0 and end_frame_no is None \
+                    and time.time() - checkpoint_time >= config.CHECKPOINT_INTERVAL:
+                checkpoint_time = time.time()
+                self._put_checkpoint({
+                    'frame_no': current_frame_no,
+                    'is_finding_start_frame_no': is_finding_start_frame_no,
+                    'is_finding_end_frame_no': is_finding_end_frame_no,
+                    'start_frame_no': start_frame_no,
+                    'start_result': None if start_result is None else
+                    [start_result['frame_no'], encode_result(start_result['dt_box'], start_result['rec_res'])],
+                    'pending': [[ocr_info_frame_no, encode_result(dt_box, rec_res)]
+                                for ocr_info_frame_no, dt_box, rec_res, _ in ocr_args_list],
+                })
 
         while len(ocr_args_list) > 0:
-            total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
-            if current_frame_no in compare_ocr_result_cache:
-                predict_result = compare_ocr_result_cache[current_frame_no]
-                dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
+            ocr_info_frame_no, dt_box, rec_res, ocr_frame = ocr_args_list.pop(0)
+            self._put_ocr_task(ocr_info_frame_no, dt_box, rec_res, frame=ocr_frame)
+        self.video_cap.release()
+        if self.ocr_cache is not None and replay is None and full_pass:
+            self.ocr_cache.save_pass(run_key, samples, self.frame_pts.tobytes())
+        self.replay_samples = None
+        self._print_ocr_statistics()
+
+    def extract_frame_by_chunks(self):
+        """
+        Параллельное извлечение по кадрам: видео делится на CHUNK_PROCESS_NUM фрагментов, каждый фрагмент
+        декодируется и распознается в отдельном процессе, начиная на CHUNK_OVERLAP_SECONDS секунд раньше своей границы,
+        чтобы к границе фрагмента состояние поиска начального и конечного кадров совпадало с последовательным проходом.
+        Сырые субтитры фрагментов объединяются в raw.txt, строки перекрытия берутся из предыдущего фрагмента,
+        а субтитры, проходящие через границу, объединяются при удалении дубликатов
+        """
+        total_frame_count = int(self.frame_count)
+        # Фрагмент должен быть не короче одной секунды
+        chunk_num = max(min(config.CHUNK_PROCESS_NUM, total_frame_count // max(int(self.fps), 1)), 1)
+        overlap_frame_count = int(config.CHUNK_OVERLAP_SECONDS * self.fps)
+        # Фрагменту chunk_no принадлежат кадры с номерами от bounds[chunk_no] + 1 до bounds[chunk_no + 1]
+        bounds = [total_frame_count * i // chunk_num for i in range(chunk_num + 1)]
+        chunk_args = [(self.video_path, self.sub_area, self.gui_mode, chunk_no,
+                       max(bounds[chunk_no] - overlap_frame_count, 0),
+                       bounds[chunk_no + 1] if chunk_no + 1 < chunk_num else None)
+                      for chunk_no in range(chunk_num)]
+        print(f'Параллельное извлечение: фрагментов {chunk_num}')
+        self.video_cap.release()
+        chunk_results = {}
+        with multiprocessing.get_context('spawn').Pool(chunk_num) as pool:
+            for chunk_no, raw_part_path, pts_part_path in pool.imap_unordered(extract_chunk, chunk_args):
+                chunk_results[chunk_no] = (raw_part_path, pts_part_path)
+                self.update_progress(ocr=len(chunk_results) / chunk_num * 100,
+                                     frame_extract=len(chunk_results) / chunk_num * 100)
+        # Объединение результатов фрагментов
+        with open(self.raw_subtitle_path, mode='w', encoding='utf-8') as raw_subtitle_file:
+            for chunk_no in range(chunk_num):
+                raw_part_path, pts_part_path = chunk_results[chunk_no]
+                with open(raw_part_path, mode='r', encoding='utf-8') as f:
+                    for line in f:
+                        # Строки перекрытия уже записаны предыдущим фрагментом
+                        if int(line.split('\t')[0]) > bounds[chunk_no]:
+                            raw_subtitle_file.write(line)
+                os.remove(raw_part_path)
+                frame_pts = np.load(pts_part_path)
+                if len(frame_pts) == len(self.frame_pts):
+                    np.maximum(self.frame_pts, frame_pts, out=self.frame_pts)
+                os.remove(pts_part_path)
+
+    def _read_sampled_frames(self, replay_frame_nos=None, start_frame_no=0, end_frame_no=None):
+        """
+        Чтение кадров, выбранных с частотой EXTRACT_FREQUENCY
+        :param replay_frame_nos номера кадров записанного прохода, в этом случае видео не декодируется и вместо кадра возвращается None
+        :param start_frame_no количество уже обработанных кадров, видео позиционируется на следующий кадр
+        :param end_frame_no номер последнего читаемого кадра, None - до конца видео
+        :return генератор (номер кадра, кадр)
+        """
+        tbar = tqdm(total=int(self.frame_count), unit='f', position=self.progress_position, file=sys.__stdout__,
+                    initial=start_frame_no)
+        if replay_frame_nos is not None:
+            for frame_no in replay_frame_nos:
+                tbar.update(frame_no - tbar.n)
+                yield frame_no, None
+            return
+        # Декодирование только ключевых кадров: каждый ключевой кадр считается выбранным, номер кадра вычисляется по временной метке
+        keyframes_only = config.DECODER_KEYFRAMES_ONLY and config.DECODER_BACKEND == decoder.BACKEND_PYAV
+        if keyframes_only:
+            self.video_cap.release()
+            self.video_cap = self._open_video(keyframes_only=True)
+        # Номер текущего кадра видео
+        current_frame_no = start_frame_no
+        if start_frame_no > 0:
+            self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame_no)
+        sample_interval = int(self.fps / config.EXTRACT_FREQUENCY)
+        while self.video_cap.isOpened():
+            # grab только декодирует кадр, преобразование в BGR (retrieve) выполняется лишь для выбранных кадров
+            # Если чтение кадра не удалось (конец видео)
+            if not self.video_cap.grab():
+                break
+            # Успешное чтение кадра
+            if keyframes_only:
+                current_frame_no = int(self.video_cap.get(cv2.CAP_PROP_POS_FRAMES))
+                tbar.update(current_frame_no - tbar.n)
             else:
-                dt_box, rec_res = None, None
-            task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
-            # Добавление задачи
-            self.subtitle_ocr_task_queue.put(task)
+                current_frame_no += 1
+                tbar.update(1)
+            if end_frame_no is not None and current_frame_no > end_frame_no:
+                break
+            self._record_frame_pts(current_frame_no)
+            # X кадров в секунду
+            if keyframes_only or current_frame_no % sample_interval == 0:
+                ret, frame = self.video_cap.retrieve()
+                if not ret:
+                    break
+                yield current_frame_no, frame
+
+    def extract_frame_by_bisect(self):
+        """
+        Извлечение кадров с уточнением границ субтитров бинарным поиском:
+        кадры выбираются с крупным шагом BISECT_COARSE_INTERVAL секунд, и только если текст двух соседних выборок отличается,
+        точный кадр смены текста ищется бинарным поиском с позиционированием видео.
+        На каждую смену субтитров выполняется O(log n) OCR вместо O(n)
+        """
+        # Удаление кэша
+        self.__delete_frame_cache()
+
+        total_frame_count = int(self.frame_count)
+        step = max(int(self.fps * config.BISECT_COARSE_INTERVAL), 1)
+        result_cache = {}
+        tbar = tqdm(total=total_frame_count, unit='f', position=0, file=sys.__stdout__)
+        self.last_ocr_result = None
+        if self.change_detector is not None:
+            self.change_detector.reset()
+        if self.ocr is None:
+            self.ocr = OcrRecogniser()
+
+        def read_frame(frame_no):
+            # Номер кадра начинается с 1, как и при последовательном чтении
+            self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no - 1)
+            ret, frame = self.video_cap.read()
+            if ret:
+                self._record_frame_pts(frame_no)
+            return frame if ret else None
+
+        def scan_boundary(lo, hi, hi_frame, hi_result):
+            # Последовательный поиск границы в интервале (lo, hi): нечитаемые кадры пропускаются,
+            # конечным кадром субтитра считается последний прочитанный кадр с тем же текстом
+            for frame_no in range(lo + 1, hi):
+                frame = read_frame(frame_no)
+                if frame is None:
+                    continue
+                result = self._predict_frame(result_cache, frame, frame_no)
+                if not self._is_same_text(start_result['text'], result['text']):
+                    return lo, frame_no, frame, result
+                lo = frame_no
+            return lo, hi, hi_frame, hi_result
+
+        start_frame_no = 1
+        start_frame = read_frame(start_frame_no)
+        if start_frame is None:
+            self.video_cap.release()
+            return
+        start_result = self._predict_frame(result_cache, start_frame, start_frame_no)
+        self._put_ocr_task(start_frame_no, start_result['dt_box'], start_result['rec_res'], frame=start_frame)
+
+        sample_no_list = list(range(start_frame_no + step, total_frame_count + 1, step))
+        if len(sample_no_list) == 0 or sample_no_list[-1] != total_frame_count:
+            sample_no_list.append(total_frame_count)
+        prev_no = start_frame_no
+        for sample_no in sample_no_list:
+            sample_frame = read_frame(sample_no)
+            if sample_frame is None:
+                continue
+            sample_result = self._predict_frame(result_cache, sample_frame, sample_no)
+            # Между двумя выборками текст может смениться несколько раз, поэтому ищем границы, пока текст не совпадет с выборкой
+            while not self._is_same_text(start_result['text'], sample_result['text']):
+                # lo - кадр с текстом текущего субтитра, hi - кадр с другим текстом
+                lo, hi, hi_frame, hi_result = prev_no, sample_no, sample_frame, sample_result
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    mid_frame = read_frame(mid)
+                    if mid_frame is None:
+                        # Текст нечитаемого кадра неизвестен, граница оставшегося интервала ищется последовательно
+                        lo, hi, hi_frame, hi_result = scan_boundary(lo, hi, hi_frame, hi_result)
+                        break
+                    mid_result = self._predict_frame(result_cache, mid_frame, mid)
+                    if self._is_same_text(start_result['text'], mid_result['text']):
+                        lo = mid
+                    else:
+                        hi, hi_frame, hi_result = mid, mid_frame, mid_result
+                # lo - конечный кадр текущего субтитра, hi - начальный кадр следующего
+                if lo != start_frame_no:
+                    self._put_ocr_task(lo, start_result['dt_box'], start_result['rec_res'], frame=start_frame)
+                start_frame_no, start_frame, start_result = hi, hi_frame, hi_result
+                self._put_ocr_task(start_frame_no, start_result['dt_box'], start_result['rec_res'], frame=start_frame)
+                prev_no = hi
+            prev_no = sample_no
+            # Удаление из кэша результатов кадров, которые больше не понадобятся
+            for no in [no for no in result_cache if no < prev_no]:
+                del result_cache[no]
+            tbar.update(sample_no - tbar.n)
+            self.update_progress(frame_extract=(sample_no / self.frame_count) * 100)
+
+        # Последний субтитр заканчивается на последнем прочитанном кадре
+        if prev_no != start_frame_no:
+            self._put_ocr_task(prev_no, start_result['dt_box'], start_result['rec_res'], frame=start_frame)
         self.video_cap.release()
+        self._print_ocr_statistics()
 
     def extract_frame_by_det(self):
         """
@@ -534,6 +842,11 @@ class SubtitleExtractor:
         start_frame_no = 0
         start_end_frame_no = []
         start_frame = None
+        # Результат OCR начального кадра, передается в процесс OCR вместе с конечным кадром
+        start_result = None
+        self.last_ocr_result = None
+        if self.change_detector is not None:
+            self.change_detector.reset()
         if self.ocr is None:
             self.ocr = OcrRecogniser()
         while self.video_cap.isOpened():
@@ -543,6 +856,7 @@ class SubtitleExtractor:
                 break
             # Успешное чтение кадра
             current_frame_no += 1
+            self._record_frame_pts(current_frame_no)
             tbar.update(1)
             dt_boxes, elapse = self.sub_detector.detect_subtitle(frame)
             has_subtitle = False
@@ -568,14 +882,11 @@ class SubtitleExtractor:
                 # Определяем, является ли кадр начальным или конечным
                 if is_finding_start_frame_no:
                     start_frame_no = current_frame_no
-                    dt_box, rec_res = self.ocr.predict(frame)
-                    area_text1 = "".join(self.__get_area_text((dt_box, rec_res)))
-                    if start_frame_no not in compare_ocr_result_cache.keys():
-                        compare_ocr_result_cache[current_frame_no] = {'text': area_text1, 'dt_box': dt_box, 'rec_res': rec_res}
-                        frame_lru_list.append((frame, current_frame_no))
-                        ocr_args_list.append((self.frame_count, current_frame_no))
-                        # Кэшируем начальный кадр
-                        start_frame = frame
+                    start_result = self._predict_frame(compare_ocr_result_cache, frame, current_frame_no)
+                    frame_lru_list.append((frame, current_frame_no))
+                    ocr_args_list.append((current_frame_no, start_result['dt_box'], start_result['rec_res'], frame))
+                    # Кэшируем начальный кадр
+                    start_frame = frame
                     # Начинаем поиск конечного кадра
                     is_finding_start_frame_no = False
                     is_finding_end_frame_no = True
@@ -584,8 +895,9 @@ class SubtitleExtractor:
                     is_finding_end_frame_no = False
                     is_finding_start_frame_no = False
                     end_frame_no = current_frame_no
+                    end_result = self._predict_frame(compare_ocr_result_cache, frame, current_frame_no)
                     frame_lru_list.append((frame, current_frame_no))
-                    ocr_args_list.append((self.frame_count, current_frame_no))
+                    ocr_args_list.append((current_frame_no, end_result['dt_box'], end_result['rec_res'], frame))
                     start_end_frame_no.append((start_frame_no, end_frame_no))
                 # Если находимся в поиске конечного кадра
                 if is_finding_end_frame_no:
@@ -595,7 +907,7 @@ class SubtitleExtractor:
                         is_finding_start_frame_no = True
                         end_frame_no = current_frame_no - 1
                         frame_lru_list.append((start_frame, end_frame_no))
-                        ocr_args_list.append((self.frame_count, end_frame_no))
+                        ocr_args_list.append((end_frame_no, start_result['dt_box'], start_result['rec_res'], start_frame))
                         start_end_frame_no.append((start_frame_no, end_frame_no))
 
             else:
@@ -605,7 +917,7 @@ class SubtitleExtractor:
                     is_finding_end_frame_no = False
                     is_finding_start_frame_no = True
                     frame_lru_list.append((start_frame, end_frame_no))
-                    ocr_args_list.append((self.frame_count, end_frame_no))
+                    ocr_args_list.append((end_frame_no, start_result['dt_box'], start_result['rec_res'], start_frame))
                     start_end_frame_no.append((start_frame_no, end_frame_no))
 
             while len(frame_lru_list) > frame_lru_list_max_size:
@@ -615,29 +927,15 @@ class SubtitleExtractor:
                 # print(start_end_frame_no)
 
             while len(ocr_args_list) > 1:
-                total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
-                if current_frame_no in compare_ocr_result_cache:
-                    predict_result = compare_ocr_result_cache[current_frame_no]
-                    dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
-                else:
-                    dt_box, rec_res = None, None
-                # subtitle_ocr_task_queue: (total_frame_count общее количество кадров, current_frame_no текущий кадр, dt_box ограничивающая рамка, rec_res результат распознавания, время текущего кадра, subtitle_area область субтитров)
-                task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
-                # Добавление задачи
-                self.subtitle_ocr_task_queue.put(task)
+                ocr_info_frame_no, dt_box, rec_res, ocr_frame = ocr_args_list.pop(0)
+                self._put_ocr_task(ocr_info_frame_no, dt_box, rec_res, frame=ocr_frame)
                 self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
 
         while len(ocr_args_list) > 0:
-            total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
-            if current_frame_no in compare_ocr_result_cache:
-                predict_result = compare_ocr_result_cache[current_frame_no]
-                dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
-            else:
-                dt_box, rec_res = None, None
-            task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
-            # Добавление задачи
-            self.subtitle_ocr_task_queue.put(task)
+            ocr_info_frame_no, dt_box, rec_res, ocr_frame = ocr_args_list.pop(0)
+            self._put_ocr_task(ocr_info_frame_no, dt_box, rec_res, frame=ocr_frame)
         self.video_cap.release()
+        self._print_ocr_statistics()
 
     def filter_watermark(self):
         """
@@ -647,7 +945,7 @@ class SubtitleExtractor:
         watermark_areas = self._detect_watermark_area()
 
         # Случайный выбор кадра для маркировки областей водяных знаков, пользователь определяет, является ли это областью водяного знака
-        cap = cv2.VideoCapture(self.video_path)
+        cap = self._open_video()
         ret, sample_frame = False, None
         for i in range(10):
             frame_no = random.randint(int(self.frame_count * 0.1), int(self.frame_count * 0.9))
@@ -687,13 +985,7 @@ class SubtitleExtractor:
             user_input = input(f"{area_num.pop()}{str(watermark_area)} "
                                f"{config.interface_config['Main']['QuestionDelete']}").strip()
             if user_input == 'y' or user_input == '\n':
-                with open(self.raw_subtitle_path, mode='r+', encoding='utf-8') as f:
-                    content = f.readlines()
-                    f.seek(0)
-                    for i in content:
-                        if i.find(str(watermark_area[0])) == -1:
-                            f.write(i)
-                    f.truncate()
+                self.raw_store = self.raw_store.filter(~self.raw_store.coordinate_mask(watermark_area[0]))
                 print(config.interface_config['Main']['FinishDelete'])
         print(config.interface_config['Main']['FinishWaterMarkFilter'])
         # Удаление кэша
@@ -708,7 +1000,7 @@ class SubtitleExtractor:
         subtitle_area = self._detect_subtitle_area()[0][0]
 
         # Случайный выбор кадра для маркировки области, пользователь определяет, является ли это областью водяного знака
-        cap = cv2.VideoCapture(self.video_path)
+        cap = self._open_video()
         ret, sample_frame = False, None
         for i in range(10):
             frame_no = random.randint(int(self.frame_count * 0.1), int(self.frame_count * 0.9))
@@ -731,17 +1023,14 @@ class SubtitleExtractor:
         cv2.imwrite(sample_frame_file_path, sample_frame)
         print(f"{config.interface_config['Main']['CheckSubArea']} {sample_frame_file_path}")
 
-        user_input = input(f"{(ymin, ymax)} {config.interface_config['Main']['DeleteNoSubArea']}").strip()
+        if self.interactive:
+            user_input = input(f"{(ymin, ymax)} {config.interface_config['Main']['DeleteNoSubArea']}").strip()
+        else:
+            user_input = 'y'
+
         if user_input == 'y' or user_input == '\n':
-            with open(self.raw_subtitle_path, mode='r+', encoding='utf-8') as f:
-                content = f.readlines()
-                f.seek(0)
-                for i in content:
-                    i_ymin = int(i.split('\t')[1].split('(')[1].split(')')[0].split(', ')[2])
-                    i_ymax = int(i.split('\t')[1].split('(')[1].split(')')[0].split(', ')[3])
-                    if ymin <= i_ymin and i_ymax <= ymax:
-                        f.write(i)
-                f.truncate()
+            records = self.raw_store.records
+            self.raw_store = self.raw_store.filter((ymin <= records['ymin']) & (records['ymax'] <= ymax))
             print(config.interface_config['Main']['FinishDeleteNoSubArea'])
         # Удаление кэша
         if os.path.exists(sample_frame_file_path):
@@ -767,7 +1056,7 @@ class SubtitleExtractor:
                     else:
                         frame_end = self._frame_to_timecode(int(content[1]))
                     frame_content = content[2]
-                    subtitle_line = f'{line_code}\n{frame_start} --> {frame_end}\n{frame_content}\n'
+                    subtitle_line = f'{line_code}\n{frame_start} --> {frame_end}\n{frame_content}\n\n'
                     f.write(subtitle_line)
             print(f"[NO-VSF]{config.interface_config['Main']['SubLocation']} {srt_filename}")
             # Возврат строк субтитров с длительностью менее 1 с
@@ -808,100 +1097,58 @@ class SubtitleExtractor:
 
     def _detect_watermark_area(self):
         """
-        Поиск области водяного знака на основе информации о координатах в сыром txt файле
+        Поиск области водяного знака на основе информации о координатах сырых субтитров
         Предположение: координаты области водяного знака (логотипа) фиксированы по горизонтали и вертикали, т.е. (xmin, xmax, ymin, ymax) относительно постоянны
         На основе информации о координатах выполняется статистика для выбора текстовых областей с фиксированными координатами
         :return Возвращает наиболее вероятную область водяного знака
         """
-        f = open(self.raw_subtitle_path, mode='r', encoding='utf-8')  # Открытие txt файла с кодировкой 'utf-8'
-        line = f.readline()  # Чтение файла построчно
-        # Список координат
-        coordinates_list = []
-        # Список номеров кадров
-        frame_no_list = []
-        # Список содержимого
-        content_list = []
-        while line:
-            frame_no = line.split('\t')[0]
-            text_position = line.split('\t')[1].split('(')[1].split(')')[0].split(', ')
-            content = line.split('\t')[2]
-            frame_no_list.append(frame_no)
-            coordinates_list.append((int(text_position[0]),
-                                     int(text_position[1]),
-                                     int(text_position[2]),
-                                     int(text_position[3])))
-            content_list.append(content)
-            line = f.readline()
-        f.close()
         # Унификация похожих значений в списке координат
-        coordinates_list = self._unite_coordinates(coordinates_list)
-
-        # Обновление координат в исходном txt файле на нормализованные
-        with open(self.raw_subtitle_path, mode='w', encoding='utf-8') as f:
-            for frame_no, coordinate, content in zip(frame_no_list, coordinates_list, content_list):
-                f.write(f'{frame_no}\t{coordinate}\t{content}')
-
-        if len(Counter(coordinates_list).most_common()) > config.WATERMARK_AREA_NUM:
-            # Чтение конфигурации, возврат списка координат, которые могут быть областью водяного знака
-            return Counter(coordinates_list).most_common(config.WATERMARK_AREA_NUM)
-        else:
-            # Если недостаточно, возвращаем столько, сколько есть
-            return Counter(coordinates_list).most_common()
+        # Обновление координат сырых субтитров на нормализованные
+        self.raw_store.set_coordinates(self._unite_coordinates(self.raw_store.coordinates()))
+        # Чтение конфигурации, возврат списка координат, которые могут быть областью водяного знака
+        # Если недостаточно, возвращаем столько, сколько есть
+        return most_common_rows(self.raw_store.coordinates(), config.WATERMARK_AREA_NUM)
 
     def _detect_subtitle_area(self):
         """
-        Чтение сырого txt файла после фильтрации области водяного знака, поиск области субтитров на основе информации о координатах
+        Поиск области субтитров на основе информации о координатах сырых субтитров после фильтрации области водяного знака
         Предположение: область субтитров имеет относительно фиксированный диапазон координат по оси Y, по сравнению с текстом сцены, этот диапазон встречается чаще
         :return Возвращает позицию области субтитров
         """
-        # Открытие обработанного сырого txt файла с удаленной областью водяного знака
-        f = open(self.raw_subtitle_path, mode='r', encoding='utf-8')  # Открытие txt файла с кодировкой 'utf-8'
-        line = f.readline()  # Чтение файла построчно
-        # Список Y-координат
-        y_coordinates_list = []
-        while line:
-            text_position = line.split('\t')[1].split('(')[1].split(')')[0].split(', ')
-            y_coordinates_list.append((int(text_position[2]), int(text_position[3])))
-            line = f.readline()
-        f.close()
-        return Counter(y_coordinates_list).most_common(1)
+        # Y-координаты (ymin, ymax) сырых субтитров с удаленной областью водяного знака
+        return most_common_rows(self.raw_store.coordinates()[:, 2:4], 1)
+
+    def _record_frame_pts(self, current_frame_no):
+        """
+        Запись временной метки только что прочитанного кадра в индекс временных меток
+        """
+        # После чтения кадра с номером current_frame_no (начиная с 1) позиция видео указывает на кадр с индексом current_frame_no - 1
+        index = current_frame_no - 1
+        if 0 <= index < len(self.frame_pts):
+            self.frame_pts[index] = self.video_cap.get(cv2.CAP_PROP_POS_MSEC)
 
     def _frame_to_timecode(self, frame_no):
         """
         Преобразование номера кадра видео во временную метку
+        Временная метка берется из индекса, построенного во время декодирования, если кадр не декодировался,
+        она вычисляется по частоте кадров (для видео с постоянной частотой кадров результат совпадает)
         :param frame_no: Номер кадра видео, т.е. какой по счету кадр
-        :returns: Временная метка в формате SMPTE в виде строки, например '01:02:12:032' или '01:02:12;032'
-        """
-        # Установка текущего номера кадра
-        cap = cv2.VideoCapture(self.video_path)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
-        ret, _ = cap.read()
-        # Получение временной метки, соответствующей текущему номеру кадра
-        if ret:
-            milliseconds = cap.get(cv2.CAP_PROP_POS_MSEC)
-            if milliseconds <= 0:
-                return '{0:02d}:{1:02d}:{2:02d},{3:03d}'.format(int(frame_no / (3600 * self.fps)),
-                                                                int(frame_no / (60 * self.fps) % 60),
-                                                                int(frame_no / self.fps % 60),
-                                                                int(frame_no % self.fps))
-            seconds = milliseconds // 1000
-            milliseconds = int(milliseconds % 1000)
-            minutes = 0
-            hours = 0
-            if seconds >= 60:
-                minutes = int(seconds // 60)
-                seconds = int(seconds % 60)
-            if minutes >= 60:
-                hours = int(minutes // 60)
-                minutes = int(minutes % 60)
-            smpte_token = ','
-            cap.release()
-            return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, smpte_token, milliseconds)
-        else:
-            return '{0:02d}:{1:02d}:{2:02d},{3:03d}'.format(int(frame_no / (3600 * self.fps)),
-                                                            int(frame_no / (60 * self.fps) % 60),
-                                                            int(frame_no / self.fps % 60),
-                                                            int(frame_no % self.fps))
+        :returns: Временная метка в формате SMPTE в виде строки, например '01:02:12,032'
+        """
+        milliseconds = -1
+        if 0 <= frame_no < len(self.frame_pts):
+            milliseconds = self.frame_pts[frame_no]
+        if milliseconds <= 0:
+            milliseconds = self._frameno_to_milliseconds(frame_no)
+        milliseconds = int(milliseconds)
+        seconds = milliseconds // 1000
+        milliseconds = milliseconds % 1000
+        minutes = seconds // 60
+        seconds = seconds % 60
+        hours = minutes // 60
+        minutes = minutes % 60
+        smpte_token = ','
+        return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, smpte_token, milliseconds)
 
     def _timestamp_to_frameno(self, time_ms):
         return int(time_ms / self.fps)
@@ -911,135 +1158,61 @@ class SubtitleExtractor:
 
     def _remove_duplicate_subtitle(self):
         """
-        Чтение исходного сырого txt, удаление повторяющихся строк, возврат списка субтитров после дедупликации
+        Удаление повторяющихся строк сырых субтитров, возврат списка субтитров после дедупликации
         """
         self._concat_content_with_same_frameno()
-        with open(self.raw_subtitle_path, mode='r', encoding='utf-8') as r:
-            lines = r.readlines()
         RawInfo = namedtuple('RawInfo', 'no content')
-        content_list = []
-        for line in lines:
-            frame_no = line.split('\t')[0]
-            content = line.split('\t')[2]
-            content_list.append(RawInfo(frame_no, content))
+        content_list = [RawInfo(frame_no, content) for frame_no, content in self.raw_store.rows()]
         # Список уникальных субтитров
         unique_subtitle_list = []
-        idx_i = 0
         content_list_len = len(content_list)
-        # Итерация по каждой строке субтитров, запись времени начала и окончания
-        while idx_i < content_list_len:
-            i = content_list[idx_i]
-            start_frame = i.no
-            idx_j = idx_i
-            while idx_j < content_list_len:
-                # Вычисление расстояния Левенштейна между текущей и следующей строкой
-                # Проверка, отличается ли следующий кадр после idx_j от idx_i, если отличается (или это последний кадр), то найден конечный кадр
-                if idx_j + 1 == content_list_len or ratio(i.content.replace(' ', ''), content_list[idx_j + 1].content.replace(' ', '')) < config.THRESHOLD_TEXT_SIMILARITY:
-                    # Если найден конечный кадр, определяем номер конечного кадра субтитров
-                    end_frame = content_list[idx_j].no
-                    if not self.use_vsf:
-                        if end_frame == start_frame and idx_j + 1 < content_list_len:
-                            # Для случая только одного кадра используем время начала следующего кадра (если это не последний кадр)
-                            end_frame = content_list[idx_j + 1][0]
-                    # Поиск наиболее длинных субтитров
-                    similar_list = content_list[idx_i:idx_j + 1]
-                    similar_content_strip_list = [item.content.replace(' ', '') for item in similar_list]
-                    index, _ = max(enumerate(similar_content_strip_list), key=lambda x: len(x[1]))
-
-                    # Добавление в список
-                    unique_subtitle_list.append((start_frame, end_frame, similar_list[index].content))
-                    idx_i = idx_j + 1
-                    break
-                else:
-                    idx_j += 1
-                    continue
+        # Группы последовательных строк, похожих на первую строку группы: (первая строка, последняя строка, самая длинная строка)
+        deduplicator = SubtitleDeduplicator(config.THRESHOLD_TEXT_SIMILARITY, config.DEDUP_WINDOW)
+        for idx_i, idx_j, index in deduplicator.group([item.content for item in content_list]):
+            start_frame = content_list[idx_i].no
+            # Номер конечного кадра субтитров
+            end_frame = content_list[idx_j].no
+            if not self.use_vsf:
+                if end_frame == start_frame and idx_j + 1 < content_list_len:
+                    # Для случая только одного кадра используем время начала следующего кадра (если это не последний кадр)
+                    end_frame = content_list[idx_j + 1].no
+            # Добавление в список наиболее длинных субтитров группы
+            unique_subtitle_list.append((start_frame, end_frame, content_list[index].content))
         return unique_subtitle_list
 
     def _concat_content_with_same_frameno(self):
         """
-        Объединение строк субтитров с одинаковым номером кадра в сыром txt файле
-        """
-        with open(self.raw_subtitle_path, mode='r', encoding='utf-8') as r:
-            lines = r.readlines()
-        content_list = []
-        frame_no_list = []
-        for line in lines:
-            frame_no = line.split('\t')[0]
-            frame_no_list.append(frame_no)
-            coordinate = line.split('\t')[1]
-            content = line.split('\t')[2]
-            content_list.append([frame_no, coordinate, content])
-
-        # Нахождение номеров кадров, которые встречаются более одного раза
-        frame_no_list = [i[0] for i in Counter(frame_no_list).most_common() if i[1] > 1]
-
-        # Нахождение позиций, где встречаются эти номера кадров
-        concatenation_list = []
-        for frame_no in frame_no_list:
-            position = [i for i, x in enumerate(content_list) if x[0] == frame_no]
-            concatenation_list.append((frame_no, position))
-
-        for i in concatenation_list:
-            content = []
-            for j in i[1]:
-                content.append(content_list[j][2])
-            content = ' '.join(content).replace('\n', ' ') + '\n'
-            for k in i[1]:
-                content_list[k][2] = content
-
-        # Удаление лишних строк субтитров
-        to_delete = []
-        for i in concatenation_list:
-            for j in i[1][1:]:
-                to_delete.append(content_list[j])
-        for i in to_delete:
-            if i in content_list:
-                content_list.remove(i)
-
-        with open(self.raw_subtitle_path, mode='w', encoding='utf-8') as f:
-            for frame_no, coordinate, content in content_list:
-                content = unicodedata.normalize('NFKC', content)
-                f.write(f'{frame_no}\t{coordinate}\t{content}')
+        Объединение строк субтитров с одинаковым номером кадра
+        Строки группируются по номеру кадра за один проход, текст каждой группы нормализуется (NFKC)
+        """
+        self.raw_store = self.raw_store.concat_same_frame(' ', lambda text: unicodedata.normalize('NFKC', text))
 
     def _unite_coordinates(self, coordinates_list):
         """
         Унификация похожих координат в списке координат до одного значения
         Например, из-за того, что результаты обнаружения ограничивающих рамок непостоянны, координаты текста в одном и том же месте могут быть обнаружены как (255,123,456,789) в один раз и как (253,122,456,799) в другой
         Поэтому необходимо унифицировать значения похожих координат
-        :param coordinates_list Список, содержащий точки координат
-        :return: Возвращает список координат с унифицированными значениями
-        """
-        # Унификация похожих координат в одну
-        index = 0
-        for coordinate in coordinates_list:  # TODO: Сложность O(n^2), требуется оптимизация
-            for i in coordinates_list:
-                if self.__is_coordinate_similar(coordinate, i):
-                    coordinates_list[index] = i
-            index += 1
-        return coordinates_list
-
-    def _compute_image_similarity(self, image1, image2):
-        """
-        Вычисление косинусного сходства между двумя изображениями
-        """
-        image1 = self.__get_thum(image1)
-        image2 = self.__get_thum(image2)
-        images = [image1, image2]
-        vectors = []
-        norms = []
-        for image in images:
-            vector = []
-            for pixel_tuple in image.getdata():
-                vector.append(average(pixel_tuple))
-            vectors.append(vector)
-            # linalg = linear (линейная) + algebra (алгебра), norm обозначает норму
-            # Вычисление нормы изображения
-            norms.append(linalg.norm(vector, 2))
-        a, b = vectors
-        a_norm, b_norm = norms
-        # dot возвращает скалярное произведение, вычисляется для двумерных массивов (матриц)
-        res = dot(a / a_norm, b / b_norm)
-        return res
+        :param coordinates_list Массив или список N x 4, содержащий точки координат
+        :return: Возвращает массив N x 4 координат с унифицированными значениями
+        """
+        # Унификация похожих координат в одну за почти линейное время (группировка по сетке с шагом в допуск)
+        return box_utils.unite_coordinates(coordinates_list, config.PIXEL_TOLERANCE_X, config.PIXEL_TOLERANCE_Y)
+
+    @staticmethod
+    def _compute_image_similarity(image1, image2, mode='cosine'):
+        """
+        Вычисление сходства между двумя изображениями (ndarray cv2)
+        :param mode режим сравнения: cosine - косинусное сходство, ssim - упрощенный SSIM, phash - перцептивный хэш
+        """
+        return similarity.compute_similarity(image1, image2, mode)
+
+    @staticmethod
+    def _compute_image_similarity_batch(image, candidates, mode='cosine'):
+        """
+        Вычисление сходства изображения с K изображениями-кандидатами
+        :return массив из K значений сходства
+        """
+        return similarity.compute_similarity_batch(image, candidates, mode)
 
     def __get_area_text(self, ocr_result):
         """
@@ -1049,7 +1222,10 @@ class SubtitleExtractor:
         coordinates = get_coordinates(box)
         area_text = []
         for content, coordinate in zip(text, coordinates):
-            if self.sub_area is not None:
+            # Если область субтитров не указана, учитывается весь текст кадра
+            if self.sub_area is None:
+                area_text.append(content[0])
+            else:
                 s_ymin = self.sub_area[0]
                 s_ymax = self.sub_area[1]
                 s_xmin = self.sub_area[2]
@@ -1062,58 +1238,148 @@ class SubtitleExtractor:
                     area_text.append(content[0])
         return area_text
 
+    def _predict_frame(self, result_cache, frame, frame_no):
+        """
+        OCR распознавание кадра с кэшированием результата по номеру кадра.
+        Результат (dt_box, rec_res) передается в процесс OCR вместе с задачей, поэтому каждый кадр распознается только один раз,
+        а при повторном запуске на том же видео результат берется из постоянного кэша
+        """
+        if frame_no not in result_cache:
+            # Кадр записанного прохода не декодировался, результат берется из постоянного кэша
+            if frame is None and self.replay_samples is not None:
+                source_frame_no = self.replay_samples[frame_no]
+                result_cache[frame_no] = self._make_ocr_result(*self.ocr_cache.get(source_frame_no), source_frame_no)
+                return result_cache[frame_no]
+            subtitle_roi = self._get_subtitle_roi(frame)
+            # Если область субтитров не изменилась с последнего распознанного кадра, используем его результат
+            if self.change_detector is not None and self.last_ocr_result is not None \
+                    and not self.change_detector.is_changed(subtitle_roi):
+                result_cache[frame_no] = self.last_ocr_result
+                self.ocr_skip_count += 1
+                return result_cache[frame_no]
+            cached = self.ocr_cache.get(frame_no) if self.ocr_cache is not None else None
+            if cached is not None:
+                dt_box, rec_res = cached
+            else:
+                if self.ocr is None:
+                    self.ocr = OcrRecogniser()
+                # OCR выполняется только на области субтитров, координаты пересчитываются в систему координат кадра
+                dt_box, rec_res = self._predict_region(roi.crop(frame, self.ocr_region))
+                dt_box = roi.boxes_to_frame(dt_box, self.ocr_region)
+                self.ocr_predict_counter[frame_no] += 1
+                if self.ocr_cache is not None:
+                    self.ocr_cache.put(frame_no, dt_box, rec_res)
+            result_cache[frame_no] = self._make_ocr_result(dt_box, rec_res, frame_no)
+            self.last_ocr_result = result_cache[frame_no]
+            if self.change_detector is not None:
+                self.change_detector.set_reference(subtitle_roi)
+        return result_cache[frame_no]
+
+    def _open_video(self, keyframes_only=False):
+        """
+        Открытие видео бэкендом декодирования, выбранным в config
+        """
+        return decoder.open_video(self.video_path, config.DECODER_BACKEND, config.DECODER_THREADS, keyframes_only)
+
+    def _predict_region(self, image):
+        """
+        OCR распознавание изображения с адаптивным уменьшением разрешения, координаты результата - в системе координат image
+        """
+        if self.ocr_scaler is None:
+            return self.ocr.predict(image)
+        scaled_image, scale = self.ocr_scaler.resize(image)
+        dt_box, rec_res = self.ocr.predict(scaled_image)
+        return roi.scale_boxes(dt_box, scale), rec_res
+
+    def _make_ocr_result(self, dt_box, rec_res, frame_no):
+        """
+        Результат OCR кадра: текст области субтитров, dt_box, rec_res и номер кадра, на котором выполнено OCR
+        (номер кадра нужен для записи прохода в кэш и контрольных точек)
+        """
+        area_text = "".join(self.__get_area_text((dt_box, rec_res)))
+        return {'text': area_text, 'dt_box': dt_box, 'rec_res': rec_res, 'frame_no': frame_no}
+
+    def _get_subtitle_roi(self, frame):
+        """
+        Получение области субтитров кадра, если область не указана - весь кадр
+        """
+        if self.sub_area is None:
+            return frame
+        s_ymin, s_ymax, s_xmin, s_xmax = self.sub_area
+        return frame[s_ymin:s_ymax, s_xmin:s_xmax]
+
+    def _put_ocr_task(self, frame_no, dt_box=None, rec_res=None, total_ms=None, frame=None):
+        """
+        Добавление задачи в очередь OCR
+        Если dt_box и rec_res не переданы, процесс OCR сам распознает кадр
+        Уже декодированный кадр передается через разделяемую память только тогда, когда он нужен процессу OCR:
+        для распознавания или для вывода отладочной информации, в остальных случаях процесс OCR не читает видео
+        """
+        frame_ref = None
+        if frame is not None and self.frame_ring is not None and \
+                (dt_box is None or rec_res is None or config.DEBUG_OCR_LOSS):
+            frame_ref = self._wait_ocr_pool(self.frame_ring.put,
+                                            subtitle_ocr.frame_preprocess(self.default_subtitle_area, frame))
+        # subtitle_ocr_task_queue: (total_frame_count общее количество кадров, current_frame_no текущий кадр, dt_box ограничивающая рамка, rec_res результат распознавания, время текущего кадра, subtitle_area область субтитров, frame_ref ссылка на кадр в разделяемой памяти)
+        task = (self.frame_count, frame_no, dt_box, rec_res, total_ms, self.default_subtitle_area, frame_ref)
+        self._wait_ocr_pool(self.subtitle_ocr_task_queue.put, task)
+
+    def _put_checkpoint(self, state):
+        """
+        Добавление контрольной точки в очередь OCR. Процесс записи сохраняет её, когда все предыдущие задачи записаны в raw.txt
+        :param state состояние извлечения по кадрам, достаточное для продолжения с кадра state['frame_no']
+        """
+        # Индекс временных меток сохраняется заранее: к моменту записи контрольной точки он содержит все нужные кадры
+        np.save(self.frame_pts_path + '.tmp.npy', self.frame_pts)
+        os.replace(self.frame_pts_path + '.tmp.npy', self.frame_pts_path)
+        self._wait_ocr_pool(self.subtitle_ocr_task_queue.put,
+                            (self.frame_count, subtitle_ocr.CHECKPOINT_FRAME_NO, state, None, None, None, None))
+
+    def _wait_ocr_pool(self, put, item):
+        """
+        Передача элемента в ограниченную очередь конвейера OCR (put очереди задач или кольцевого буфера кадров).
+        Пока очередь заполнена, периодически проверяется состояние процессов OCR: если они завершились или сообщили
+        об ошибке, вызывается исключение, а не бесконечное ожидание
+        """
+        if self.subtitle_ocr_pool is None:
+            return put(item)
+        while True:
+            self.subtitle_ocr_pool.check()
+            try:
+                return put(item, timeout=subtitle_ocr.PUT_TIMEOUT)
+            except (queue.Full, queue.Empty):
+                continue
+
+    def _print_ocr_statistics(self):
+        """
+        Вывод статистики OCR распознавания: количество распознанных кадров и повторных распознаваний
+        """
+        predict_count = sum(self.ocr_predict_counter.values())
+        repeat_count = predict_count - len(self.ocr_predict_counter)
+        cache_hit_count = self.ocr_cache.hit_count if self.ocr_cache is not None else 0
+        print(f"OCR: распознано кадров {len(self.ocr_predict_counter)}, вызовов {predict_count}, повторных {repeat_count}, "
+              f"пропущено без изменений {self.ocr_skip_count}, из кэша {cache_hit_count}")
+
     def _compare_ocr_result(self, result_cache, img1, img1_no, img2, img2_no):
         """
         Сравнение, совпадает ли текст области субтитров, предсказанный для двух изображений
         """
-        if self.ocr is None:
-            self.ocr = OcrRecogniser()
-        if img1_no in result_cache:
-            area_text1 = result_cache[img1_no]['text']
-        else:
-            dt_box, rec_res = self.ocr.predict(img1)
-            area_text1 = "".join(self.__get_area_text((dt_box, rec_res)))
-            result_cache[img1_no] = {'text': area_text1, 'dt_box': dt_box, 'rec_res': rec_res}
-
-        if img2_no in result_cache:
-            area_text2 = result_cache[img2_no]['text']
-        else:
-            dt_box, rec_res = self.ocr.predict(img2)
-            area_text2 = "".join(self.__get_area_text((dt_box, rec_res)))
-            result_cache[img2_no] = {'text': area_text2, 'dt_box': dt_box, 'rec_res': rec_res}
+        area_text1 = self._predict_frame(result_cache, img1, img1_no)['text']
+        area_text2 = self._predict_frame(result_cache, img2, img2_no)['text']
         delete_no_list = []
         for no in result_cache:
             if no < min(img1_no, img2_no) - 10:
                 delete_no_list.append(no)
         for no in delete_no_list:
             del result_cache[no]
-        if ratio(area_text1, area_text2) > config.THRESHOLD_TEXT_SIMILARITY:
-            return True
-        else:
-            return False
+        return self._is_same_text(area_text1, area_text2)
 
     @staticmethod
-    def __is_coordinate_similar(coordinate1, coordinate2):
+    def _is_same_text(text1, text2):
         """
-        Проверка, похожи ли две координаты. Если разница между xmin, xmax, ymin, ymax двух координатных точек находится в пределах допуска по пикселям,
-        то считается, что эти две координатные точки похожи
+        Совпадает ли текст субтитров с учетом порога схожести текста
         """
-        return abs(coordinate1[0] - coordinate2[0]) < config.PIXEL_TOLERANCE_X and \
-            abs(coordinate1[1] - coordinate2[1]) < config.PIXEL_TOLERANCE_X and \
-            abs(coordinate1[2] - coordinate2[2]) < config.PIXEL_TOLERANCE_Y and \
-            abs(coordinate1[3] - coordinate2[3]) < config.PIXEL_TOLERANCE_Y
-
-    @staticmethod
-    def __get_thum(image, size=(64, 64), greyscale=False):
-        """
-        Унифицированная обработка изображения
-        """
-        # Изменение размера изображения с использованием image, Image.Resampling.LANCZOS для высокого качества
-        image = image.resize(size, Image.Resampling.LANCZOS)
-        if greyscale:
-            # Преобразование изображения в режим L, который является градациями серого, каждый пиксель представлен 8 битами
-            image = image.convert('L')
-        return image
+        return ratio(text1, text2) > config.THRESHOLD_TEXT_SIMILARITY
 
     def __delete_frame_cache(self):
         if not config.DEBUG_NO_DELETE_CACHE:
@@ -1129,6 +1395,15 @@ class SubtitleExtractor:
             if os.path.exists(self.temp_output_dir):
                 shutil.rmtree(self.temp_output_dir, True)
 
+    @property
+    def sub_detector(self):
+        """
+        Объект детектирования субтитров, создается при первом обращении
+        """
+        if self._sub_detector is None:
+            self._sub_detector = SubtitleDetect()
+        return self._sub_detector
+
     def update_progress(self, ocr=None, frame_extract=None):
         """
         Обновление прогресса
@@ -1141,6 +1416,27 @@ class SubtitleExtractor:
             self.progress_frame_extract = frame_extract
         self.progress_total = (self.progress_frame_extract + self.progress_ocr) / 2
 
+    def get_ocr_options(self):
+        """
+        Параметры обработки результатов OCR, передаваемые в процессы OCR
+        """
+        return {'REC_CHAR_TYPE': config.REC_CHAR_TYPE,
+                'DROP_SCORE': config.DROP_SCORE,
+                'SUB_AREA_DEVIATION_RATE': config.SUB_AREA_DEVIATION_RATE,
+                'DEBUG_OCR_LOSS': config.DEBUG_OCR_LOSS,
+                'OCR_BATCH_SIZE': config.OCR_BATCH_SIZE,
+                'OCR_BATCH_TIMEOUT': config.OCR_BATCH_TIMEOUT,
+                'OCR_TARGET_TEXT_HEIGHT': config.OCR_TARGET_TEXT_HEIGHT,
+                'OCR_MAX_INPUT_SIDE': config.OCR_MAX_INPUT_SIDE,
+                'OCR_EXPECTED_TEXT_HEIGHT_RATIO': config.OCR_EXPECTED_TEXT_HEIGHT_RATIO,
+                'FRAME_HEIGHT': self.frame_height,
+                'DECODER_BACKEND': config.DECODER_BACKEND,
+                'DECODER_THREADS': config.DECODER_THREADS,
+                'TASK_QUEUE_SIZE': config.TASK_QUEUE_SIZE,
+                'OCR_QUEUE_SIZE': config.OCR_QUEUE_SIZE,
+                'RESULT_QUEUE_SIZE': config.RESULT_QUEUE_SIZE,
+                }
+
     def start_subtitle_ocr_async(self):
         def get_ocr_progress():
             """
@@ -1161,17 +1457,28 @@ class SubtitleExtractor:
                 if current_frame_no == -1:
                     return
 
+        # Задачи OCR обрабатываются в текущем процессе, результаты сразу записываются в raw.txt
+        if self.inline_ocr:
+            self.subtitle_ocr_task_queue = subtitle_ocr.InlineTaskWriter(self.video_path, self.raw_subtitle_path,
+                                                                         self.sub_area, self.get_ocr_options(),
+                                                                         self.ocr)
+            return subtitle_ocr.OcrProcessPool([])
+        # Кадры, декодированные в основном процессе, передаются в процесс OCR через разделяемую память
+        if config.STREAM_FRAMES and self.frame_width > 0 and self.frame_height > 0:
+            self.frame_ring = SharedFrameRing(config.FRAME_RING_SLOTS, self.frame_width * self.frame_height * 3)
         process, task_queue, progress_queue = subtitle_ocr.async_start(self.video_path,
                                                                        self.raw_subtitle_path,
                                                                        self.sub_area,
-                                                                       options={'REC_CHAR_TYPE': config.REC_CHAR_TYPE,
-                                                                                'DROP_SCORE': config.DROP_SCORE,
-                                                                                'SUB_AREA_DEVIATION_RATE': config.SUB_AREA_DEVIATION_RATE,
-                                                                                'DEBUG_OCR_LOSS': config.DEBUG_OCR_LOSS,
-                                                                                }
+                                                                       options=self.get_ocr_options(),
+                                                                       frame_ring=self.frame_ring,
+                                                                       worker_num=config.OCR_WORKER_NUM or
+                                                                       runtime.default_ocr_worker_num(config.USE_GPU),
+                                                                       resume_offset=None if self.resume_checkpoint is None
+                                                                       else self.resume_checkpoint[0]
                                                                        )
         self.subtitle_ocr_task_queue = task_queue
         self.subtitle_ocr_progress_queue = progress_queue
+        self.subtitle_ocr_pool = process
         # Запуск потока для обновления прогресса OCR
         Thread(target=get_ocr_progress, daemon=True).start()
         return process
@@ -1186,8 +1493,31 @@ class SubtitleExtractor:
                 f.write(f'{sub.text}\n')
 
 
+def extract_chunk(args):
+    """
+    Процесс извлечения одного фрагмента видео: результаты OCR записываются в собственный файл сырых субтитров
+    непосредственно в этом процессе, без отдельных процессов OCR
+    :param args (путь к видео, область субтитров, режим GUI, номер фрагмента, begin_frame_no, end_frame_no)
+    :return (номер фрагмента, путь к файлу сырых субтитров фрагмента, путь к индексу временных меток фрагмента)
+    """
+    video_path, sub_area, gui_mode, chunk_no, begin_frame_no, end_frame_no = args
+    extractor = SubtitleExtractor(video_path, sub_area, gui_mode=gui_mode, use_ocr_cache=False)
+    extractor.progress_position = chunk_no
+    raw_part_path = os.path.join(extractor.subtitle_output_dir, f'raw_{chunk_no}.txt')
+    pts_part_path = os.path.join(extractor.subtitle_output_dir, f'frame_pts_{chunk_no}.npy')
+    extractor.subtitle_ocr_task_queue = subtitle_ocr.InlineTaskWriter(video_path, raw_part_path, sub_area,
+                                                                      extractor.get_ocr_options())
+    extractor.extract_frame_by_fps(begin_frame_no, end_frame_no)
+    extractor._put_ocr_task(-1)
+    np.save(pts_part_path, extractor.frame_pts)
+    return chunk_no, raw_part_path, pts_part_path
+
+
 if __name__ == '__main__':
     multiprocessing.set_start_method("spawn")
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true', help='Продолжить извлечение с последней контрольной точки')
+    cli_args = parser.parse_args()
     # Запрос у пользователя пути к видео
     video_path = input(f"{config.interface_config['Main']['InputVideo']}").strip()
     # Запрос у пользователя области субтитров
@@ -1198,6 +1528,6 @@ if __name__ == '__main__':
     except ValueError as e:
         subtitle_area = None
     # Создание объекта извлечения субтитров
-    se = SubtitleExtractor(video_path, subtitle_area, gui_mode=False)
+    se = SubtitleExtractor(video_path, subtitle_area, gui_mode=False, resume=cli_args.resume)
     # Начало извлечения субтитров
     se.run()
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Бенчмарки производительности: python backend/tools/benchmark.py <имя бенчмарка>
+       import - время холодного импорта модулей, каждый импорт выполняется в новом процессе интерпретатора
+       unite - унификация координат текстовых строк на синтетических данных
+       concat - объединение строк сырых субтитров с одинаковым номером кадра
+       reading-order - упорядочивание рамок кадра в порядке чтения (кадры титров с большим количеством строк)
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+import numpy as np
+
+# Каталог backend, из которого модули импортируются так же, как при запуске main.py
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Модули, время импорта которых измеряется по умолчанию
+IMPORT_MODULES = ('config', 'main')
+# Допуски по пикселям, как в config по умолчанию
+PIXEL_TOLERANCE_X = 100
+PIXEL_TOLERANCE_Y = 50
+# Размер синтетических данных по умолчанию
+UNITE_COUNT = 100000
+CONCAT_COUNT = 200000
+READING_ORDER_FRAMES = 200
+# Количество текстовых рамок в кадре титров
+READING_ORDER_BOXES = 120
+
+
+def parse_importtime(stderr, top=10):
+    """
+    Самые медленные модули по собственному времени импорта из вывода python -X importtime
+    :return список (время в секундах, имя модуля)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        rows.append((int(self_us) / 1000000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def measure_import(module, repeat=5):
+    """
+    Время холодного импорта модуля в новом процессе
+    :return (список времен в секундах, самые медленные модули последнего запуска) или None, если импорт завершился ошибкой
+    """
+    times = []
+    stderr = ''
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - start_time
+        if result.returncode != 0:
+            print(result.stderr.strip().splitlines()[-1])
+            return None
+        times.append(elapsed)
+        stderr = result.stderr
+    return times, parse_importtime(stderr)
+
+
+def benchmark_import(args):
+    for module in args.modules or IMPORT_MODULES:
+        result = measure_import(module, args.repeat)
+        if result is None:
+            print(f'{module}: ошибка импорта')
+            continue
+        times, slowest = result
+        print(f'{module}: медиана {statistics.median(times):.3f} с, минимум {min(times):.3f} с ({len(times)} запусков)')
+        for elapsed, name in slowest:
+            print(f'    {elapsed:8.3f} с  {name}')
+
+
+def synthetic_coordinates(count, seed=0):
+    """
+    Синтетические координаты текстовых строк фильма 1920x1080: субтитры внизу кадра с дрожанием рамок,
+    водяной знак в углу и случайный текст сцены
+    :return массив count x 4 (xmin, xmax, ymin, ymax)
+    """
+    rng = np.random.default_rng(seed)
+    kind = rng.choice(3, size=count, p=[0.7, 0.2, 0.1])
+    width = rng.integers(200, 1200, size=count)
+    subtitle_xmin = 960 - width // 2 + rng.integers(-8, 9, size=count)
+    subtitle = np.stack([subtitle_xmin, subtitle_xmin + width,
+                         950 + rng.integers(-6, 7, size=count), 1000 + rng.integers(-6, 7, size=count)], axis=1)
+    watermark = np.stack([1700 + rng.integers(-3, 4, size=count), 1880 + rng.integers(-3, 4, size=count),
+                          40 + rng.integers(-3, 4, size=count), 80 + rng.integers(-3, 4, size=count)], axis=1)
+    scene_xmin = rng.integers(0, 1700, size=count)
+    scene_ymin = rng.integers(0, 1000, size=count)
+    scene = np.stack([scene_xmin, scene_xmin + rng.integers(20, 220, size=count),
+                      scene_ymin, scene_ymin + rng.integers(15, 80, size=count)], axis=1)
+    return np.choose(kind[:, None], [subtitle, watermark, scene])
+
+
+def legacy_unite_coordinates(coordinates_list):
+    """
+    Прежняя реализация унификации координат со сложностью O(n^2), для сравнения
+    """
+    def is_similar(coordinate1, coordinate2):
+        return abs(coordinate1[0] - coordinate2[0]) < PIXEL_TOLERANCE_X and \
+            abs(coordinate1[1] - coordinate2[1]) < PIXEL_TOLERANCE_X and \
+            abs(coordinate1[2] - coordinate2[2]) < PIXEL_TOLERANCE_Y and \
+            abs(coordinate1[3] - coordinate2[3]) < PIXEL_TOLERANCE_Y
+
+    index = 0
+    for coordinate in coordinates_list:
+        for i in coordinates_list:
+            if is_similar(coordinate, i):
+                coordinates_list[index] = i
+        index += 1
+    return coordinates_list
+
+
+def benchmark_unite(args):
+    from tools.box_utils import unite_coordinates
+    args.count = args.count or UNITE_COUNT
+    coordinates = synthetic_coordinates(args.count)
+    times = []
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        united = unite_coordinates(coordinates, PIXEL_TOLERANCE_X, PIXEL_TOLERANCE_Y)
+        times.append(time.perf_counter() - start_time)
+    print(f'unite_coordinates, {args.count} рамок: медиана {statistics.median(times):.3f} с, '
+          f'групп {len(np.unique(united, axis=0))} из {len(np.unique(coordinates, axis=0))} уникальных координат')
+    # Результат не зависит от порядка входных координат
+    permutation = np.random.default_rng(1).permutation(len(coordinates))
+    shuffled = unite_coordinates(coordinates[permutation], PIXEL_TOLERANCE_X, PIXEL_TOLERANCE_Y)
+    print(f'Детерминированность при перестановке входа: {np.array_equal(united[permutation], shuffled)}')
+    # Прежняя реализация квадратичная, поэтому измеряется на подвыборке и пересчитывается на полный размер
+    sample_count = min(args.count, 2000)
+    sample = [tuple(c) for c in coordinates[:sample_count].tolist()]
+    start_time = time.perf_counter()
+    legacy_unite_coordinates(sample)
+    elapsed = time.perf_counter() - start_time
+    print(f'Прежняя реализация, {sample_count} рамок: {elapsed:.3f} с, '
+          f'оценка для {args.count} рамок: {elapsed * (args.count / sample_count) ** 2:.0f} с')
+
+
+def synthetic_raw_rows(count, seed=0):
+    """
+    Синтетические строки сырых субтитров: примерно треть кадров содержит две или три текстовые строки
+    :return список (номер кадра, координаты, текст, уверенность)
+    """
+    rng = np.random.default_rng(seed)
+    words = ['привет', 'мир', 'subtitle', 'line', 'кадр', 'текст', 'video', 'OCR']
+    coordinates = synthetic_coordinates(count, seed).tolist()
+    rows = []
+    frame_no = 0
+    while len(rows) < count:
+        frame_no += int(rng.integers(1, 10))
+        line_count = int(rng.choice([1, 2, 3], p=[0.67, 0.28, 0.05]))
+        for _ in range(min(line_count, count - len(rows))):
+            text = ' '.join(words[k] for k in rng.integers(0, len(words), size=3))
+            rows.append((frame_no, tuple(coordinates[len(rows)]), text, float(rng.random())))
+    return rows
+
+
+def legacy_concat_content_with_same_frameno(lines):
+    """
+    Прежняя реализация объединения строк raw.txt с одинаковым номером кадра, для сравнения
+    """
+    content_list = []
+    frame_no_list = []
+    for line in lines:
+        frame_no = line.split('\t')[0]
+        frame_no_list.append(frame_no)
+        content_list.append([frame_no, line.split('\t')[1], line.split('\t')[2]])
+    frame_no_list = [i[0] for i in Counter(frame_no_list).most_common() if i[1] > 1]
+    concatenation_list = []
+    for frame_no in frame_no_list:
+        position = [i for i, x in enumerate(content_list) if x[0] == frame_no]
+        concatenation_list.append((frame_no, position))
+    for i in concatenation_list:
+        content = ' '.join(content_list[j][2] for j in i[1]).replace('\n', ' ') + '\n'
+        for k in i[1]:
+            content_list[k][2] = content
+    to_delete = []
+    for i in concatenation_list:
+        for j in i[1][1:]:
+            to_delete.append(content_list[j])
+    for i in to_delete:
+        if i in content_list:
+            content_list.remove(i)
+    return content_list
+
+
+def benchmark_concat(args):
+    from tools.raw_store import RawSubtitleStore
+    args.count = args.count or CONCAT_COUNT
+    rows = synthetic_raw_rows(args.count)
+    store = RawSubtitleStore.from_rows(rows)
+    times = []
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        result = store.concat_same_frame(' ')
+        times.append(time.perf_counter() - start_time)
+    print(f'concat_same_frame, {args.count} строк: медиана {statistics.median(times):.3f} с, '
+          f'кадров {len(result)}')
+    # Прежняя реализация квадратичная, поэтому измеряется на подвыборке и пересчитывается на полный размер
+    sample_count = min(args.count, 10000)
+    lines = [f'{str(frame_no).zfill(8)}\t{coordinate}\t{text}\n' for frame_no, coordinate, text, _ in rows[:sample_count]]
+    start_time = time.perf_counter()
+    legacy = legacy_concat_content_with_same_frameno(lines)
+    elapsed = time.perf_counter() - start_time
+    print(f'Прежняя реализация, {sample_count} строк: {elapsed:.3f} с, '
+          f'оценка для {args.count} строк: {elapsed * (args.count / sample_count) ** 2:.0f} с')
+    # Результат совпадает с прежней реализацией (с точностью до пробелов)
+    sample = RawSubtitleStore.from_rows(rows[:sample_count]).concat_same_frame(' ').rows()
+    expected = [(int(frame_no), ' '.join(content.split())) for frame_no, _, content in legacy]
+    print(f'Совпадение с прежней реализацией: {sample == expected}')
+
+
+def synthetic_credit_frames(frame_count, box_count, seed=0):
+    """
+    Синтетические кадры титров: несколько колонок строк с дрожанием рамок, рамки в порядке выдачи детектора
+    :return список кадров, каждый кадр - (рамки детектирования, результаты распознавания)
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(frame_count):
+        column_count = int(rng.integers(1, 4))
+        row = np.arange(box_count) // column_count
+        column = np.arange(box_count) % column_count
+        xmin = 100 + column * (1700 // column_count) + rng.integers(-5, 6, size=box_count)
+        xmax = xmin + rng.integers(100, 1700 // column_count - 20, size=box_count)
+        ymin = 20 + row * 25 + rng.integers(-3, 4, size=box_count)
+        ymax = ymin + 20
+        boxes = np.stack([np.stack([xmin, ymin], axis=1), np.stack([xmax, ymin], axis=1),
+                          np.stack([xmax, ymax], axis=1), np.stack([xmin, ymax], axis=1)], axis=1).astype(np.float32)
+        order = rng.permutation(box_count)
+        frames.append(([boxes[i] for i in order], [(f'строка {i}', 0.9) for i in order]))
+    return frames
+
+
+def legacy_rank_result(detection_box, recognise_result):
+    """
+    Прежняя реализация упорядочивания результата OCR (группировка строк проверкой вхождения в список и сортировка пузырьком),
+    для сравнения
+    """
+    def y_round(y):
+        y_min = y + 10 - y % 10
+        y_max = y - y % 10
+        if abs(y - y_min) < abs(y - y_max):
+            return y_min
+        else:
+            return y_max
+
+    coordinate_list = list()
+    for i in detection_box:
+        i = list(i)
+        (x1, y1) = int(i[0][0]), int(i[0][1])
+        (x2, y2) = int(i[1][0]), int(i[1][1])
+        (x3, y3) = int(i[2][0]), int(i[2][1])
+        (x4, y4) = int(i[3][0]), int(i[3][1])
+        coordinate_list.append([max(x1, x4), min(x2, x3), max(y1, y2), min(y3, y4)])
+    lines = []
+    for i in coordinate_list:
+        if len(lines) < 1:
+            lines.append(y_round(i[2]))
+        elif y_round(i[2]) not in lines and y_round(i[2]) + 10 not in lines and y_round(i[2]) - 10 not in lines:
+            lines.append(y_round(i[2]))
+    lines = sorted(lines)
+    for i in coordinate_list:
+        for j in lines:
+            if abs(j - y_round(i[2])) <= 10:
+                i[2] = j
+    to_rank_res = list(zip(coordinate_list, recognise_result))
+    ranked_res = []
+    for line in lines:
+        tmp_list = [i for i in to_rank_res if i[0][2] == line]
+        for k in range(1, len(tmp_list)):
+            for j in range(0, len(tmp_list) - k):
+                if tmp_list[j][0][2] > tmp_list[j + 1][0][2]:
+                    tmp_list[j], tmp_list[j + 1] = tmp_list[j + 1], tmp_list[j]
+        for k in range(1, len(tmp_list)):
+            for j in range(0, len(tmp_list) - k):
+                if tmp_list[j][0][0] > tmp_list[j + 1][0][0]:
+                    tmp_list[j], tmp_list[j + 1] = tmp_list[j + 1], tmp_list[j]
+        ranked_res.extend(tmp_list)
+    dt_box = [[(i[0], i[2]), (i[1], i[2]), (i[1], i[3]), (i[0], i[3])] for i, _ in ranked_res]
+    return dt_box, [i[1] for i in ranked_res]
+
+
+def benchmark_reading_order(args):
+    from tools.reading_order import rank_boxes
+    frame_count = args.count or READING_ORDER_FRAMES
+    frames = synthetic_credit_frames(frame_count, READING_ORDER_BOXES)
+    times = []
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        ranked = [rank_boxes(detection_box, recognise_result) for detection_box, recognise_result in frames]
+        times.append(time.perf_counter() - start_time)
+    print(f'rank_boxes, {frame_count} кадров по {READING_ORDER_BOXES} рамок: медиана {statistics.median(times):.3f} с')
+    start_time = time.perf_counter()
+    legacy = [legacy_rank_result(detection_box, recognise_result) for detection_box, recognise_result in frames]
+    elapsed = time.perf_counter() - start_time
+    print(f'Прежняя реализация: {elapsed:.3f} с')
+    # Прежняя группировка строк зависит от порядка рамок: верхняя граница строки берется от первой встреченной рамки,
+    # поэтому сравнивается только порядок результатов распознавания
+    matched = sum(result[1] == expected[1] for result, expected in zip(ranked, legacy))
+    print(f'Совпадение порядка с прежней реализацией: {matched} из {frame_count} кадров')
+
+
+BENCHMARKS = {
+    'import': benchmark_import,
+    'unite': benchmark_unite,
+    'concat': benchmark_concat,
+    'reading-order': benchmark_reading_order,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарки производительности')
+    parser.add_argument('name', choices=sorted(BENCHMARKS.keys()), help='Имя бенчмарка')
+    parser.add_argument('--repeat', type=int, default=5, help='Количество повторений')
+    parser.add_argument('--modules', nargs='*', default=None, help='Модули для бенчмарка import')
+    parser.add_argument('--count', type=int, default=None, help='Размер синтетических данных')
+    cli_args = parser.parse_args()
+    sys.path.insert(0, BACKEND_DIR)
+    BENCHMARKS[cli_args.name](cli_args)
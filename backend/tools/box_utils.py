@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Векторные операции над координатами текстовых строк (xmin, xmax, ymin, ymax)
+"""
+import itertools
+import numpy as np
+
+# Смещения соседних ячеек сетки по четырем координатам
+_NEIGHBOUR_OFFSETS = list(itertools.product((-1, 0, 1), repeat=4))
+
+
+def overflow_area_rate(sub_area, coordinates):
+    """
+    Пересечение текстовых строк с областью субтитров и доля площади строк за пределами области для всех строк сразу.
+    Обе фигуры - прямоугольники, параллельные осям, поэтому пересечение вычисляется по интервалам координат.
+    Строки, касающиеся области стороной или углом, считаются пересекающимися (пересечение нулевой площади)
+    :param sub_area область субтитров (ymin, ymax, xmin, xmax)
+    :param coordinates массив или список N x 4 (xmin, xmax, ymin, ymax), строки из нескольких кадров можно передать вместе
+    :return (пересекается ли строка с областью - массив N bool,
+             доля выхода за границы: (площадь области + площадь строки - площадь пересечения) / площадь области - 1,
+             для непересекающихся строк 0 - массив N float)
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 4)
+    s_ymin, s_ymax, s_xmin, s_xmax = (float(v) for v in sub_area)
+    # Рамка с перепутанными границами задает тот же прямоугольник
+    xmin = np.minimum(coordinates[:, 0], coordinates[:, 1])
+    xmax = np.maximum(coordinates[:, 0], coordinates[:, 1])
+    ymin = np.minimum(coordinates[:, 2], coordinates[:, 3])
+    ymax = np.maximum(coordinates[:, 2], coordinates[:, 3])
+    inter_width = np.minimum(xmax, s_xmax) - np.maximum(xmin, s_xmin)
+    inter_height = np.minimum(ymax, s_ymax) - np.maximum(ymin, s_ymin)
+    intersects = (inter_width >= 0) & (inter_height >= 0)
+    sub_area_area = (s_xmax - s_xmin) * (s_ymax - s_ymin)
+    box_area = (xmax - xmin) * (ymax - ymin)
+    intersection_area = np.where(intersects, np.maximum(inter_width, 0) * np.maximum(inter_height, 0), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = ((sub_area_area + box_area - intersection_area) / sub_area_area) - 1
+    return intersects, np.where(intersects, rate, 0.0)
+
+
+def unite_coordinates(coordinates, tolerance_x, tolerance_y):
+    """
+    Унификация похожих координат: координаты, отличающиеся по xmin и xmax меньше чем на tolerance_x,
+    а по ymin и ymax меньше чем на tolerance_y, заменяются одной координатой группы.
+    Уникальные координаты обходятся по убыванию частоты (при равной частоте - по возрастанию значения),
+    каждая присоединяется к самой частой уже выбранной похожей координате или становится новой координатой группы.
+    Выбранные координаты хранятся в сетке с шагом в допуск: в одной ячейке может быть не больше одной выбранной координаты,
+    поэтому для каждой координаты проверяются только 81 соседняя ячейка, и время работы почти линейное
+    :param coordinates массив или список N x 4
+    :return массив N x 4 унифицированных координат
+    """
+    coordinates = np.asarray(coordinates, dtype=np.int64).reshape(-1, 4)
+    if len(coordinates) == 0:
+        return coordinates
+    values, inverse, counts = np.unique(coordinates, axis=0, return_inverse=True, return_counts=True)
+    tolerance = (tolerance_x, tolerance_x, tolerance_y, tolerance_y)
+    cells = np.floor_divide(values, np.maximum(np.array(tolerance), 1)).tolist()
+    value_list = values.tolist()
+    # Номер координаты группы для каждой уникальной координаты
+    leaders = np.empty(len(values), dtype=np.int64)
+    # Ячейка сетки -> номер выбранной в ней координаты группы, и порядок выбора координат групп
+    grid = {}
+    rank = {}
+    for i in np.argsort(-counts, kind='stable').tolist():
+        value = value_list[i]
+        cell = cells[i]
+        leader = None
+        for offset in _NEIGHBOUR_OFFSETS:
+            j = grid.get((cell[0] + offset[0], cell[1] + offset[1], cell[2] + offset[2], cell[3] + offset[3]))
+            if j is None or (leader is not None and rank[j] > rank[leader]):
+                continue
+            if all(abs(a - b) < t for a, b, t in zip(value, value_list[j], tolerance)):
+                leader = j
+        if leader is None:
+            leader = i
+            rank[i] = len(rank)
+            grid[tuple(cell)] = i
+        leaders[i] = leader
+    return values[leaders][inverse.reshape(-1)]
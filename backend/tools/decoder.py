@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Бэкенды декодирования видео. Все бэкенды предоставляют тот же интерфейс, что и cv2.VideoCapture
+       (isOpened, read, grab, retrieve, get, set, release), поэтому места вызова не зависят от выбранного бэкенда
+"""
+import os
+import cv2
+
+# Бэкенд по умолчанию: FFmpeg через OpenCV
+BACKEND_OPENCV = 'opencv'
+# Бэкенд PyAV (pip install av): многопоточное декодирование, может декодировать только ключевые кадры
+BACKEND_PYAV = 'pyav'
+
+
+def open_video(path, backend=BACKEND_OPENCV, threads=0, keyframes_only=False):
+    """
+    Открытие видео выбранным бэкендом
+    :param path путь к видео
+    :param backend 'opencv' или 'pyav'
+    :param threads количество потоков декодирования, 0 - по количеству ядер процессора
+    :param keyframes_only декодировать только ключевые кадры (только PyAV), номер кадра вычисляется по временной метке
+    :return объект с интерфейсом cv2.VideoCapture
+    """
+    threads = threads or os.cpu_count() or 1
+    if backend == BACKEND_PYAV:
+        try:
+            return PyAvCapture(path, threads, keyframes_only)
+        except ImportError:
+            print('PyAV не установлен (pip install av), используется декодирование через OpenCV')
+    elif backend != BACKEND_OPENCV:
+        raise ValueError(f'Неизвестный бэкенд декодирования: {backend}')
+    return open_opencv_capture(path, threads)
+
+
+def open_opencv_capture(path, threads):
+    """
+    cv2.VideoCapture на бэкенде FFmpeg с заданным количеством потоков декодирования
+    """
+    if hasattr(cv2, 'CAP_PROP_N_THREADS'):
+        cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_N_THREADS, threads])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    # Старая версия OpenCV или видео не открывается через FFmpeg - бэкенд выбирается OpenCV
+    return cv2.VideoCapture(path)
+
+
+class PyAvCapture:
+    """
+    Декодирование через PyAV (libavcodec) с многопоточным декодированием кадров.
+    В режиме keyframes_only декодер пропускает все кадры, кроме ключевых, что в десятки раз дешевле полного декодирования
+    """
+
+    def __init__(self, path, threads=0, keyframes_only=False):
+        import av
+        self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+        if threads:
+            self.stream.codec_context.thread_count = threads
+        self.keyframes_only = keyframes_only
+        if keyframes_only:
+            self.stream.codec_context.skip_frame = 'NONKEY'
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 0.0
+        self.frame_count = self.stream.frames
+        if not self.frame_count and self.container.duration:
+            self.frame_count = int(self.container.duration / 1000000 * self.fps)
+        # Временная метка первого кадра потока (в единицах time_base), во многих MPEG-TS и MKV она не равна 0.
+        # Время кадров отсчитывается от нее, как в OpenCV
+        self.start_pts = self.stream.start_time or 0
+        self.frame_width = self.stream.codec_context.width
+        self.frame_height = self.stream.codec_context.height
+        # Итератор декодированных кадров
+        self.frames = None
+        # Кадр, найденный при позиционировании, возвращается следующим вызовом grab
+        self.pending_frame = None
+        # Последний прочитанный кадр (av.VideoFrame)
+        self.frame = None
+        # Номер следующего кадра (как CAP_PROP_POS_FRAMES) и временная метка последнего прочитанного кадра
+        self.pos_frames = 0
+        self.pos_msec = 0.0
+
+    def isOpened(self):
+        return self.container is not None
+
+    def _frame_msec(self, frame):
+        if frame.pts is None:
+            return self.pos_frames * 1000 / self.fps if self.fps > 0 else 0.0
+        return float((frame.pts - self.start_pts) * self.stream.time_base * 1000)
+
+    def _next_frame(self):
+        if self.pending_frame is not None:
+            frame, self.pending_frame = self.pending_frame, None
+            return frame
+        if self.frames is None:
+            self.frames = self.container.decode(self.stream)
+        return next(self.frames, None)
+
+    def grab(self):
+        """
+        Декодирование следующего кадра без преобразования в BGR
+        """
+        if self.container is None:
+            return False
+        frame = self._next_frame()
+        if frame is None:
+            return False
+        self.frame = frame
+        self.pos_msec = self._frame_msec(frame)
+        if self.keyframes_only:
+            self.pos_frames = int(round(self.pos_msec / 1000 * self.fps)) + 1
+        else:
+            self.pos_frames += 1
+        return True
+
+    def retrieve(self):
+        """
+        Преобразование последнего декодированного кадра в BGR
+        """
+        if self.frame is None:
+            return False, None
+        return True, self.frame.to_ndarray(format='bgr24')
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.frame_width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.frame_height)
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.pos_frames)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            return self.pos_msec
+        return 0.0
+
+    def set(self, prop_id, value):
+        """
+        Позиционирование по номеру кадра (CAP_PROP_POS_FRAMES) или времени (CAP_PROP_POS_MSEC):
+        переход к ближайшему предшествующему ключевому кадру и декодирование до нужного кадра
+        """
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            if self.fps <= 0:
+                return False
+            target_frame_no = int(value)
+            target_msec = target_frame_no * 1000 / self.fps
+        elif prop_id == cv2.CAP_PROP_POS_MSEC:
+            target_msec = float(value)
+            target_frame_no = int(round(target_msec / 1000 * self.fps)) if self.fps > 0 else 0
+        else:
+            return False
+        self.container.seek(int(target_msec / 1000 / self.stream.time_base) + self.start_pts, stream=self.stream,
+                            backward=True, any_frame=False)
+        self.frames = self.container.decode(self.stream)
+        self.pending_frame = None
+        # Допуск в половину кадра на неточность временных меток
+        tolerance = 500 / self.fps if self.fps > 0 else 0
+        for frame in self.frames:
+            if self._frame_msec(frame) >= target_msec - tolerance:
+                self.pending_frame = frame
+                break
+        self.pos_frames = target_frame_no
+        return self.pending_frame is not None
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Удаление повторяющихся строк субтитров: группировка последовательных строк с похожим текстом
+"""
+from Levenshtein import ratio
+
+# Запас порога досрочного выхода на ошибку округления
+CUTOFF_EPSILON = 1e-6
+
+
+def normalize_text(text):
+    """
+    Текст для сравнения: пробелы не учитываются
+    """
+    return text.replace(' ', '')
+
+
+class SubtitleDeduplicator:
+    """
+    Группировка последовательных строк субтитров с похожим текстом.
+    Каждая строка нормализуется один раз, одинаковые нормализованные тексты сравниваются по индексу в таблице текстов,
+    пары, которые не могут достичь порога по длине, отбрасываются без вычисления расстояния, расстояние Левенштейна
+    вычисляется с досрочным выходом (score_cutoff), а результат сравнения пары текстов запоминается
+    """
+
+    def __init__(self, threshold, window=0):
+        """
+        :param threshold порог схожести текста (THRESHOLD_TEXT_SIMILARITY)
+        :param window количество непохожих строк подряд, через которые группа продолжается, если за ними снова идет
+                      похожая строка (мерцание текста A-B-A), 0 - группа заканчивается на первой непохожей строке
+        """
+        self.threshold = threshold
+        self.window = window
+        # Нормализованные тексты, индекс текста для каждой строки и длины текстов
+        self.texts = []
+        self.text_ids = []
+        self.lengths = []
+        # Запомненные результаты сравнения пар текстов
+        self.similar_cache = {}
+
+    def _is_similar_text(self, id1, id2):
+        if id1 == id2:
+            return True
+        key = (id1, id2) if id1 < id2 else (id2, id1)
+        similar = self.similar_cache.get(key)
+        if similar is None:
+            len1 = self.lengths[id1]
+            len2 = self.lengths[id2]
+            # Максимально возможное сходство строк разной длины: 2 * min / (len1 + len2)
+            if 2 * min(len1, len2) < self.threshold * (len1 + len2):
+                similar = False
+            else:
+                # Порог досрочного выхода немного ниже threshold: ratio сравнивает с ним нормированное расстояние
+                # с ошибкой округления, и пары точно на пороге иначе считались бы непохожими
+                similar = ratio(self.texts[id1], self.texts[id2],
+                                score_cutoff=max(self.threshold - CUTOFF_EPSILON, 0)) >= self.threshold
+            self.similar_cache[key] = similar
+        return similar
+
+    def is_similar(self, i, j):
+        """
+        Похож ли текст строки i на текст строки j
+        """
+        return self._is_similar_text(self.text_ids[i], self.text_ids[j])
+
+    def group(self, contents):
+        """
+        Группировка строк: группа начинается со строки i и продолжается, пока следующие строки похожи на строку i
+        :param contents тексты строк субтитров по порядку
+        :return список (индекс первой строки, индекс последней строки, индекс самой длинной похожей строки группы)
+        """
+        index = {}
+        self.texts = []
+        self.lengths = []
+        self.text_ids = []
+        self.similar_cache = {}
+        for content in contents:
+            text = normalize_text(content)
+            text_id = index.get(text)
+            if text_id is None:
+                text_id = index[text] = len(self.texts)
+                self.texts.append(text)
+                self.lengths.append(len(text))
+            self.text_ids.append(text_id)
+        count = len(self.text_ids)
+        groups = []
+        i = 0
+        while i < count:
+            members = [i]
+            j = i
+            while j + 1 < count:
+                if self.is_similar(i, j + 1):
+                    j += 1
+                    members.append(j)
+                    continue
+                # Непохожие строки внутри окна пропускаются, если за ними снова идет похожая строка
+                k = next((k for k in range(j + 2, min(j + 2 + self.window, count)) if self.is_similar(i, k)), None)
+                if k is None:
+                    break
+                j = k
+                members.append(j)
+            # Самая длинная строка группы (первая из строк максимальной длины)
+            best = max(members, key=lambda k: self.lengths[self.text_ids[k]])
+            groups.append((i, j, best))
+            i = j + 1
+        return groups
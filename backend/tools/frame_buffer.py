@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Кольцевой буфер кадров в разделяемой памяти для передачи кадров из основного процесса в процесс OCR без повторного декодирования
+"""
+from multiprocessing import shared_memory
+import numpy as np
+from tools.pipeline_metrics import bounded_queue
+
+
+class SharedFrameRing:
+    """
+    Кольцевой буфер фиксированного размера в разделяемой памяти.
+    Основной процесс копирует кадр в свободный слот и передает в очереди задач только ссылку на слот
+    (номер слота, shape, dtype), процесс OCR читает кадр напрямую из разделяемой памяти и освобождает слот.
+    Если свободных слотов нет, put блокируется, поэтому количество кадров "в пути" ограничено
+    """
+
+    def __init__(self, slot_count, slot_size):
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_count * slot_size)
+        # Очередь свободных слотов, время ожидания get - время, которое извлечение кадров ждет процесс OCR
+        self.free_slots = bounded_queue('свободных слотов кадров', slot_count)
+        for slot in range(slot_count):
+            self.free_slots.put(slot)
+
+    def __getstate__(self):
+        return {'slot_count': self.slot_count, 'slot_size': self.slot_size,
+                'shm_name': self.shm.name, 'free_slots': self.free_slots}
+
+    def __setstate__(self, state):
+        self.slot_count = state['slot_count']
+        self.slot_size = state['slot_size']
+        self.free_slots = state['free_slots']
+        # Подключение к уже созданной разделяемой памяти
+        self.shm = shared_memory.SharedMemory(name=state['shm_name'])
+
+    def put(self, frame, timeout=None):
+        """
+        Копирование кадра в свободный слот
+        :param timeout максимальное время ожидания свободного слота, по истечении - queue.Empty
+        :return ссылка на слот (slot, shape, dtype)
+        """
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.slot_size:
+            raise ValueError(f'Размер кадра {frame.nbytes} превышает размер слота {self.slot_size}')
+        slot = self.free_slots.get(block=True, timeout=timeout)
+        buf = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=slot * self.slot_size)
+        buf[:] = frame
+        return slot, frame.shape, frame.dtype.str
+
+    def get(self, frame_ref):
+        """
+        Получение кадра по ссылке без копирования, кадр действителен до вызова release
+        """
+        slot, shape, dtype = frame_ref
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=slot * self.slot_size)
+
+    def release(self, frame_ref):
+        """
+        Освобождение слота
+        """
+        self.free_slots.put(frame_ref[0])
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Реестр моделей процесса: каждая модель создается при первом обращении и одна на процесс для одного
+       каталога модели и набора параметров, поэтому повторные SubtitleExtractor и OcrRecogniser не загружают её заново
+"""
+import threading
+
+# Загруженные модели: (вид модели, ключ) -> объект модели
+_models = {}
+_lock = threading.Lock()
+
+
+def get_model(kind, key, factory):
+    """
+    Модель вида kind с ключом key (каталог модели и параметры, влияющие на её создание)
+    :param factory функция без аргументов, создающая модель, вызывается только при первом обращении
+    """
+    with _lock:
+        model = _models.get((kind, key))
+        if model is None:
+            model = factory()
+            _models[(kind, key)] = model
+        return model
+
+
+def get_text_detector(model_dir):
+    """
+    Модель детектирования текста DB из каталога model_dir
+    """
+    def create():
+        from tools.infer import utility
+        from tools.infer.predict_det import TextDetector
+        args = utility.parse_args()
+        args.det_algorithm = 'DB'
+        args.det_model_dir = model_dir
+        return TextDetector(args)
+    return get_model('det', model_dir, create)
+
+
+def loaded_models():
+    """
+    Ключи загруженных моделей
+    """
+    with _lock:
+        return list(_models.keys())
+
+
+def clear():
+    """
+    Освобождение всех моделей процесса
+    """
+    with _lock:
+        _models.clear()
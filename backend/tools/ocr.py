@@ -1,95 +1,84 @@
 import os
+import copy
 import config
-import importlib
 from paddleocr import PaddleOCR
+from tools.infer.predict_system import sorted_boxes
+from tools.infer.utility import get_rotate_crop_image, get_minarea_rect_crop
+from tools import model_registry, reading_order
 
 # 加载文本检测+识别模型
 class OcrRecogniser:
     def __init__(self):
-        # 获取参数对象
-        importlib.reload(config)
         self.recogniser = self.init_model()
 
-    @staticmethod
-    def y_round(y):
-        y_min = y + 10 - y % 10
-        y_max = y - y % 10
-        if abs(y - y_min) < abs(y - y_max):
-            return y_min
-        else:
-            return y_max
-
     def predict(self, image):
         detection_box, recognise_result, _ = self.recogniser(image, cls=False)
-        if len(detection_box) > 0:
-            coordinate_list = list()
-            if isinstance(detection_box, list):
-                for i in detection_box:
-                    i = list(i)
-                    (x1, y1) = int(i[0][0]), int(i[0][1])
-                    (x2, y2) = int(i[1][0]), int(i[1][1])
-                    (x3, y3) = int(i[2][0]), int(i[2][1])
-                    (x4, y4) = int(i[3][0]), int(i[3][1])
-                    xmin = max(x1, x4)
-                    xmax = min(x2, x3)
-                    ymin = max(y1, y2)
-                    ymax = min(y3, y4)
-                    coordinate_list.append([xmin, xmax, ymin, ymax])
+        return self._rank_result(detection_box, recognise_result)
 
-            # 计算有多少行字幕，将每行字幕最小的ymin值放入lines
-            lines = []
-            for i in coordinate_list:
-                if len(lines) < 1:
-                    lines.append(self.y_round(i[2]))
+    def predict_batch(self, frames):
+        """
+        批量识别多帧图像
+        文本检测模型每次只能处理一张图像，因此逐帧检测文本框；
+        所有帧的文本行截图合并后一次送入识别模型，由识别模型按rec_batch_num分批推理
+        :param frames 视频帧列表
+        :return 与frames一一对应的(dt_box, rec_res)列表
+        """
+        frame_boxes = []
+        img_crop_list = []
+        for frame in frames:
+            dt_boxes, _ = self.recogniser.text_detector(frame)
+            if dt_boxes is None or len(dt_boxes) == 0:
+                frame_boxes.append([])
+                continue
+            dt_boxes = sorted_boxes(dt_boxes)
+            for box in dt_boxes:
+                tmp_box = copy.deepcopy(box)
+                if getattr(self.recogniser.args, 'det_box_type', 'quad') == 'quad':
+                    img_crop_list.append(get_rotate_crop_image(frame, tmp_box))
                 else:
-                    if self.y_round(i[2]) not in lines \
-                            and self.y_round(i[2]) + 10 not in lines \
-                            and self.y_round(i[2]) - 10 not in lines:
-                        lines.append(self.y_round(i[2]))
-            lines = sorted(lines)
+                    img_crop_list.append(get_minarea_rect_crop(frame, tmp_box))
+            frame_boxes.append(dt_boxes)
+        rec_res_list = []
+        if len(img_crop_list) > 0:
+            rec_res_list, _ = self.recogniser.text_recognizer(img_crop_list)
+        results = []
+        offset = 0
+        for dt_boxes in frame_boxes:
+            detection_box, recognise_result = [], []
+            for box, rec_result in zip(dt_boxes, rec_res_list[offset:offset + len(dt_boxes)]):
+                # 与单帧识别一致，过滤低于drop_score的结果
+                if rec_result[1] >= self.recogniser.drop_score:
+                    detection_box.append(box)
+                    recognise_result.append(rec_result)
+            offset += len(dt_boxes)
+            results.append(self._rank_result(detection_box, recognise_result))
+        return results
 
-            for i in coordinate_list:
-                for j in lines:
-                    if abs(j - self.y_round(i[2])) <= 10:
-                        i[2] = j
-
-            to_rank_res = list(zip(coordinate_list, recognise_result))
-            ranked_res = []
-            for line in lines:
-                tmp_list = []
-                for i in to_rank_res:
-                    if i[0][2] == line:
-                        tmp_list.append(i)
-                # 先根据纵坐标排序
-                for k in range(1, len(tmp_list)):
-                    for j in range(0, len(tmp_list) - k):
-                        if tmp_list[j][0][2] > tmp_list[j + 1][0][2]:
-                            print(tmp_list[j][0][2])
-                            tmp_list[j], tmp_list[j + 1] = tmp_list[j + 1], tmp_list[j]
-                # 再根据横坐标排列
-                for l in range(1, len(tmp_list)):
-                    for j in range(0, len(tmp_list) - l):
-                        if tmp_list[j][0][0] > tmp_list[j + 1][0][0]:
-                            tmp_list[j], tmp_list[j + 1] = tmp_list[j + 1], tmp_list[j]
-                for m in tmp_list:
-                    ranked_res.append(m)
-            dt_box = []
-            for i in [j[0] for j in ranked_res]:
-                dt_box.append([(i[0], i[2]), (i[1], i[2]), (i[1], i[3]), (i[0], i[3])])
-            res = [i[1] for i in ranked_res]
-            return dt_box, res
+    def _rank_result(self, detection_box, recognise_result):
+        """
+        将识别结果按行从上到下、行内从左到右排序
+        """
+        if len(detection_box) > 0:
+            return reading_order.rank_boxes(detection_box, recognise_result)
         else:
             return detection_box, recognise_result
 
     def init_model(self):
+        # 同一进程中相同模型与参数只加载一次，所有OcrRecogniser对象共享同一个PaddleOCR
+        key = (config.USE_GPU, config.DET_MODEL_PATH, config.REC_MODEL_PATH, config.REC_CHAR_TYPE,
+               config.MODEL_VERSION, str(config.REC_IMAGE_SHAPE), config.REC_BATCH_NUM, config.OCR_BATCH_SIZE,
+               config.MAX_BATCH_SIZE, tuple(config.ONNX_PROVIDERS))
+        return model_registry.get_model('ocr', key, self.create_model)
+
+    def create_model(self):
         return PaddleOCR(use_gpu=config.USE_GPU,
                          gpu_mem=500,
                          det_algorithm='DB',
                          # 设置文本检测模型路径
                          det_model_dir=self.convertToOnnxModelIfNeeded(config.DET_MODEL_PATH),
                          rec_algorithm='CRNN',
-                         # 设置每张图文本框批处理数量
-                         rec_batch_num=config.REC_BATCH_NUM,
+                         # 设置每张图文本框批处理数量，多帧批量识别时一次识别多帧的文本框
+                         rec_batch_num=max(config.REC_BATCH_NUM, config.OCR_BATCH_SIZE),
                          # 设置文本识别模型路径
                          rec_model_dir=self.convertToOnnxModelIfNeeded(config.REC_MODEL_PATH),
                          max_batch_size=config.MAX_BATCH_SIZE,
@@ -156,17 +145,6 @@ def get_coordinates(dt_box):
     :param dt_box 检测框返回结果
     :return list 坐标点列表
     """
-    coordinate_list = list()
     if isinstance(dt_box, list):
-        for i in dt_box:
-            i = list(i)
-            (x1, y1) = int(i[0][0]), int(i[0][1])
-            (x2, y2) = int(i[1][0]), int(i[1][1])
-            (x3, y3) = int(i[2][0]), int(i[2][1])
-            (x4, y4) = int(i[3][0]), int(i[3][1])
-            xmin = max(x1, x4)
-            xmax = min(x2, x3)
-            ymin = max(y1, y2)
-            ymax = min(y3, y4)
-            coordinate_list.append((xmin, xmax, ymin, ymax))
-    return coordinate_list
+        return [tuple(i) for i in reading_order.box_coordinates(dt_box).tolist()]
+    return list()
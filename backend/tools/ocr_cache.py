@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Постоянный кэш результатов OCR на диске (SQLite), ключ - хэш содержимого видео, пути моделей и область субтитров
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Размер блока, по которому вычисляется хэш содержимого видео
+FINGERPRINT_BLOCK_SIZE = 1024 * 1024
+# Количество записей, после которого изменения фиксируются в базе
+COMMIT_INTERVAL = 200
+
+
+def file_fingerprint(path, block_size=FINGERPRINT_BLOCK_SIZE):
+    """
+    Хэш содержимого видеофайла: размер файла и блоки из начала, середины и конца файла.
+    Чтение всего многогигабайтного файла заняло бы больше времени, чем сама проверка кэша
+    """
+    size = os.path.getsize(path)
+    sha1 = hashlib.sha1(str(size).encode('utf-8'))
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(size // 2 - block_size // 2, 0), max(size - block_size, 0)}):
+            f.seek(offset)
+            sha1.update(f.read(block_size))
+    return sha1.hexdigest()
+
+
+def make_key(*parts):
+    """
+    Ключ кэша из произвольных частей (хэш видео, пути моделей, область субтитров, параметры)
+    """
+    return hashlib.sha1(json.dumps([str(part) for part in parts]).encode('utf-8')).hexdigest()
+
+
+def encode_result(dt_box, rec_res):
+    """
+    Преобразование результата OCR (dt_box, rec_res) в списки, пригодные для JSON
+    """
+    boxes = [[[int(point[0]), int(point[1])] for point in box] for box in (dt_box if dt_box is not None else [])]
+    texts = [[str(res[0]), float(res[1])] for res in (rec_res if rec_res is not None else [])]
+    return [boxes, texts]
+
+
+def decode_result(data):
+    """
+    Обратное преобразование encode_result
+    :return (dt_box, rec_res) в том же формате, что и OcrRecogniser.predict
+    """
+    boxes, texts = data
+    return [[tuple(point) for point in box] for box in boxes], [tuple(res) for res in texts]
+
+
+def dump_result(dt_box, rec_res):
+    """
+    Сериализация результата OCR (dt_box, rec_res) в компактный JSON
+    """
+    return json.dumps(encode_result(dt_box, rec_res), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def load_result(blob):
+    """
+    Десериализация результата OCR
+    """
+    return decode_result(json.loads(blob))
+
+
+class OcrResultCache:
+    """
+    Кэш результатов OCR по кадрам одного видео и записанные проходы извлечения кадров для повторного запуска без декодирования видео
+    """
+
+    def __init__(self, db_path, video_key, max_size):
+        self.db_path = db_path
+        self.video_key = video_key
+        self.max_size = max_size
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS videos (video_key TEXT PRIMARY KEY, last_access REAL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS frames (video_key TEXT, frame_no INTEGER, result BLOB, '
+                          'PRIMARY KEY (video_key, frame_no)) WITHOUT ROWID')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS passes (video_key TEXT, run_key TEXT, samples TEXT, pts BLOB, '
+                          'PRIMARY KEY (video_key, run_key)) WITHOUT ROWID')
+        self.conn.execute('INSERT OR REPLACE INTO videos (video_key, last_access) VALUES (?, ?)',
+                          (video_key, time.time()))
+        self.conn.commit()
+        self.pending_count = 0
+        self.hit_count = 0
+
+    def get(self, frame_no):
+        """
+        Результат OCR кадра из кэша
+        :return (dt_box, rec_res) или None
+        """
+        row = self.conn.execute('SELECT result FROM frames WHERE video_key = ? AND frame_no = ?',
+                                (self.video_key, frame_no)).fetchone()
+        if row is None:
+            return None
+        self.hit_count += 1
+        return load_result(row[0])
+
+    def put(self, frame_no, dt_box, rec_res):
+        """
+        Сохранение результата OCR кадра
+        """
+        self.conn.execute('INSERT OR REPLACE INTO frames (video_key, frame_no, result) VALUES (?, ?, ?)',
+                          (self.video_key, frame_no, dump_result(dt_box, rec_res)))
+        self.pending_count += 1
+        if self.pending_count >= COMMIT_INTERVAL:
+            self.commit()
+
+    def has_frames(self, frame_nos):
+        """
+        Есть ли в кэше результаты OCR всех кадров frame_nos (строки кадров могли быть удалены независимо от прохода)
+        """
+        cached = {row[0] for row in self.conn.execute('SELECT frame_no FROM frames WHERE video_key = ?',
+                                                      (self.video_key,))}
+        return cached.issuperset(frame_nos)
+
+    def load_pass(self, run_key):
+        """
+        Записанный проход извлечения кадров для параметров выборки run_key
+        :return (samples, pts) или None, если проход не записан:
+                samples - список [номер выбранного кадра, номер кадра, результат OCR которого использован для него],
+                pts - байты индекса временных меток кадров
+        """
+        row = self.conn.execute('SELECT samples, pts FROM passes WHERE video_key = ? AND run_key = ?',
+                                (self.video_key, run_key)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save_pass(self, run_key, samples, pts):
+        """
+        Сохранение полного прохода извлечения кадров, результаты OCR самих кадров хранятся в таблице frames
+        """
+        self.conn.execute('INSERT OR REPLACE INTO passes (video_key, run_key, samples, pts) VALUES (?, ?, ?, ?)',
+                          (self.video_key, run_key, json.dumps(samples, separators=(',', ':')), pts))
+        self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_count = 0
+
+    def size(self):
+        """
+        Размер данных базы: занятые страницы без свободных. Страницы удаленных записей используются повторно,
+        поэтому файл не растет дальше max_size и VACUUM, требующий монопольного доступа к базе, не нужен
+        """
+        page_count = self.conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist_count = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def evict(self):
+        """
+        Удаление данных давно не использованных видео, пока размер кэша превышает max_size
+        """
+        self.commit()
+        if self.size() <= self.max_size:
+            return
+        keys = [row[0] for row in self.conn.execute('SELECT video_key FROM videos WHERE video_key != ? '
+                                                    'ORDER BY last_access', (self.video_key,))]
+        for key in keys:
+            self.conn.execute('DELETE FROM frames WHERE video_key = ?', (key,))
+            self.conn.execute('DELETE FROM passes WHERE video_key = ?', (key,))
+            self.conn.execute('DELETE FROM videos WHERE video_key = ?', (key,))
+            self.conn.commit()
+            if self.size() <= self.max_size:
+                break
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Метрики очередей конвейера OCR: глубина очереди и время ожидания на каждой стадии.
+       Долгое ожидание put означает, что следующая стадия не успевает (очередь заполнена),
+       долгое ожидание get - что не успевает предыдущая стадия (очередь пуста)
+"""
+import multiprocessing
+import queue
+import time
+
+# Счетчики стадии в разделяемом массиве
+PUT_COUNT, PUT_STALL, GET_COUNT, GET_STALL, DEPTH_SUM, DEPTH_SAMPLES, MAX_DEPTH = range(7)
+
+
+class QueueMetrics:
+    """
+    Счетчики одной стадии конвейера. Хранятся в разделяемой памяти, поэтому процессы и потоки,
+    работающие с очередью стадии, накапливают общую статистику, а основной процесс выводит её после завершения
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.values = multiprocessing.Array('d', 7)
+
+    def record(self, count_index, stall_index, elapsed, depth):
+        with self.values.get_lock():
+            self.values[count_index] += 1
+            self.values[stall_index] += elapsed
+            if depth is not None:
+                self.values[DEPTH_SUM] += depth
+                self.values[DEPTH_SAMPLES] += 1
+                self.values[MAX_DEPTH] = max(self.values[MAX_DEPTH], depth)
+
+    def summary(self):
+        """
+        Строка статистики стадии: средняя и максимальная глубина очереди, суммарное время ожидания put и get
+        """
+        with self.values.get_lock():
+            values = list(self.values)
+        mean_depth = values[DEPTH_SUM] / values[DEPTH_SAMPLES] if values[DEPTH_SAMPLES] > 0 else 0
+        return f'{self.name}: размер {self.maxsize}, глубина средняя {mean_depth:.1f} максимальная {int(values[MAX_DEPTH])}, ' \
+               f'ожидание put {values[PUT_STALL]:.2f} с ({int(values[PUT_COUNT])}), ' \
+               f'ожидание get {values[GET_STALL]:.2f} с ({int(values[GET_COUNT])})'
+
+
+class MeteredQueue:
+    """
+    Очередь с учетом времени ожидания и глубины, интерфейс put/get/qsize такой же, как у queue.Queue и multiprocessing.Queue
+    """
+
+    def __init__(self, wrapped_queue, metrics):
+        self.queue = wrapped_queue
+        self.metrics = metrics
+
+    def qsize(self):
+        # На macOS multiprocessing.Queue.qsize не реализован, глубина в этом случае не учитывается
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:
+            return None
+
+    def put(self, item, block=True, timeout=None):
+        start_time = time.perf_counter()
+        self.queue.put(item, block, timeout)
+        self.metrics.record(PUT_COUNT, PUT_STALL, time.perf_counter() - start_time, self.qsize())
+
+    def get(self, block=True, timeout=None):
+        start_time = time.perf_counter()
+        try:
+            item = self.queue.get(block, timeout)
+        except queue.Empty:
+            # Ожидание, не дождавшееся элемента, тоже учитывается как простой стадии
+            self.metrics.record(GET_COUNT, GET_STALL, time.perf_counter() - start_time, None)
+            raise
+        self.metrics.record(GET_COUNT, GET_STALL, time.perf_counter() - start_time, self.qsize())
+        return item
+
+
+def bounded_queue(name, maxsize, queue_class=multiprocessing.Queue):
+    """
+    Ограниченная очередь стадии с метриками: при заполнении put блокируется, и предыдущая стадия ждет следующую
+    :param queue_class multiprocessing.Queue для очередей между процессами, queue.Queue для очередей между потоками
+    """
+    return MeteredQueue(queue_class(maxsize), QueueMetrics(name, maxsize))
+
+
+def print_report(metrics_list):
+    """
+    Вывод статистики всех стадий конвейера
+    """
+    for metrics in metrics_list:
+        print(f'Очередь {metrics.summary()}')
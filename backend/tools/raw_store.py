@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Промежуточное хранилище сырых субтитров: столбцовый массив записей NumPy (номер кадра, координаты, уверенность)
+       и таблица уникальных текстов. raw.txt разбирается один раз, вся последующая обработка выполняется над массивами
+"""
+import numpy as np
+
+# Тип записи: номер кадра, координаты текстовой строки (xmin, xmax, ymin, ymax), уверенность распознавания
+# и индекс текста в таблице текстов
+RAW_DTYPE = np.dtype([('frame_no', np.int64),
+                      ('xmin', np.int32), ('xmax', np.int32), ('ymin', np.int32), ('ymax', np.int32),
+                      ('score', np.float32),
+                      ('text_id', np.int32)])
+# Столбцы координат в порядке записи в raw.txt
+COORDINATE_FIELDS = ['xmin', 'xmax', 'ymin', 'ymax']
+
+
+def format_line(frame_no, coordinate, text, score):
+    """
+    Строка raw.txt: номер кадра, координаты (xmin, xmax, ymin, ymax), текст и уверенность распознавания через табуляцию
+    """
+    return f'{str(frame_no).zfill(8)}\t{tuple(int(c) for c in coordinate)}\t{text}\t{float(score):.4f}\n'
+
+
+def parse_line(line):
+    """
+    Разбор строки raw.txt
+    Строки старого формата без столбца уверенности разбираются с уверенностью NaN
+    :return (номер кадра, (xmin, xmax, ymin, ymax), текст, уверенность)
+    """
+    parts = line.rstrip('\n').split('\t')
+    score = float('nan')
+    if len(parts) > 3:
+        try:
+            score = float(parts[-1])
+            parts = parts[:-1]
+        except ValueError:
+            pass
+    coordinate = tuple(int(c) for c in parts[1].strip('()').split(', '))
+    return int(parts[0]), coordinate, '\t'.join(parts[2:]), score
+
+
+def most_common_rows(rows, n=None):
+    """
+    Наиболее частые строки двумерного массива в том же порядке, что и Counter.most_common:
+    по убыванию количества, при равном количестве - по первому появлению
+    :return список (кортеж значений строки, количество)
+    """
+    if len(rows) == 0:
+        return []
+    values, first_index, counts = np.unique(rows, axis=0, return_index=True, return_counts=True)
+    order = np.lexsort((first_index, -counts))
+    if n is not None:
+        order = order[:n]
+    return [(tuple(int(v) for v in values[i]), int(counts[i])) for i in order]
+
+
+class RawSubtitleStore:
+    """
+    Сырые субтитры в памяти: records - массив записей RAW_DTYPE, texts - таблица текстов,
+    одинаковые тексты хранятся один раз и сравниваются по индексу
+    """
+
+    def __init__(self, records=None, texts=None):
+        self.records = records if records is not None else np.empty(0, dtype=RAW_DTYPE)
+        self.texts = texts if texts is not None else []
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Создание хранилища из последовательности (номер кадра, координаты, текст, уверенность)
+        """
+        text_ids = {}
+        texts = []
+        items = []
+        for frame_no, coordinate, text, score in rows:
+            text_id = text_ids.get(text)
+            if text_id is None:
+                text_id = text_ids[text] = len(texts)
+                texts.append(text)
+            items.append((frame_no, *coordinate, score, text_id))
+        return cls(np.array(items, dtype=RAW_DTYPE), texts)
+
+    @classmethod
+    def load(cls, raw_subtitle_path):
+        """
+        Чтение raw.txt
+        """
+        with open(raw_subtitle_path, mode='r', encoding='utf-8') as f:
+            return cls.from_rows(parse_line(line) for line in f if line.strip())
+
+    @classmethod
+    def load_npz(cls, path):
+        """
+        Чтение хранилища, сохраненного методом save
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['records'], data['texts'].tolist())
+
+    def save(self, path):
+        """
+        Сохранение хранилища в двоичном виде (.npz)
+        """
+        np.savez(path, records=self.records, texts=np.array(self.texts, dtype=str))
+
+    def write_text(self, raw_subtitle_path):
+        """
+        Запись хранилища в формате raw.txt
+        """
+        with open(raw_subtitle_path, mode='w', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(format_line(record['frame_no'], [record[name] for name in COORDINATE_FIELDS],
+                                    self.texts[record['text_id']], record['score']))
+
+    def __len__(self):
+        return len(self.records)
+
+    def filter(self, mask):
+        """
+        Записи, для которых mask истинна, таблица текстов общая с исходным хранилищем
+        """
+        return RawSubtitleStore(self.records[mask], self.texts)
+
+    def concat_same_frame(self, separator=' ', normalize=None):
+        """
+        Объединение записей с одинаковым номером кадра за один проход: тексты объединяются через separator в порядке записей,
+        координаты и уверенность берутся из первой записи кадра, порядок кадров сохраняется
+        :param normalize функция нормализации объединенного текста (вызывается один раз для каждого уникального текста)
+        :return новое хранилище
+        """
+        frame_index = {}
+        keep = []
+        groups = []
+        texts = self.texts
+        for i, (frame_no, text_id) in enumerate(zip(self.records['frame_no'].tolist(), self.records['text_id'].tolist())):
+            j = frame_index.get(frame_no)
+            if j is None:
+                frame_index[frame_no] = len(keep)
+                keep.append(i)
+                groups.append([texts[text_id]])
+            else:
+                groups[j].append(texts[text_id])
+        records = self.records[keep]
+        text_ids = {}
+        new_texts = []
+        for j, group in enumerate(groups):
+            text = group[0] if len(group) == 1 else separator.join(group)
+            text_id = text_ids.get(text)
+            if text_id is None:
+                text_id = text_ids[text] = len(new_texts)
+                new_texts.append(normalize(text) if normalize is not None else text)
+            records['text_id'][j] = text_id
+        return RawSubtitleStore(records, new_texts)
+
+    def coordinates(self):
+        """
+        Координаты записей, массив N x 4 (xmin, xmax, ymin, ymax)
+        """
+        return np.stack([self.records[name] for name in COORDINATE_FIELDS], axis=1) if len(self.records) > 0 \
+            else np.empty((0, 4), dtype=np.int32)
+
+    def set_coordinates(self, coordinates):
+        """
+        Замена координат записей (массив или список N x 4)
+        """
+        coordinates = np.asarray(coordinates, dtype=np.int32).reshape(-1, 4)
+        for i, name in enumerate(COORDINATE_FIELDS):
+            self.records[name] = coordinates[:, i]
+
+    def coordinate_mask(self, coordinate):
+        """
+        Маска записей с координатами, равными coordinate (xmin, xmax, ymin, ymax)
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+        for name, value in zip(COORDINATE_FIELDS, coordinate):
+            mask &= self.records[name] == value
+        return mask
+
+    def text(self, index):
+        """
+        Текст записи с номером index
+        """
+        return self.texts[self.records['text_id'][index]]
+
+    def rows(self):
+        """
+        Записи в виде списка (номер кадра, текст)
+        """
+        return [(int(frame_no), self.texts[text_id])
+                for frame_no, text_id in zip(self.records['frame_no'].tolist(), self.records['text_id'].tolist())]
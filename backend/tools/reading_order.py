@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Порядок чтения текстовых строк кадра: группировка рамок в строки по вертикали и упорядочивание
+       сверху вниз и слева направо. Все операции выполняются над массивом рамок сразу
+"""
+import numpy as np
+
+# Шаг округления верхней границы рамки и допуск, в пределах которого рамки считаются одной строкой
+LINE_STEP = 10
+
+
+def box_coordinates(dt_box):
+    """
+    Координаты рамок детектирования (четырехугольники: левый верхний, правый верхний, правый нижний, левый нижний угол)
+    :return массив N x 4 (xmin, xmax, ymin, ymax): внутренний прямоугольник четырехугольника в целых пикселях
+    """
+    boxes = np.asarray(dt_box, dtype=np.float64)
+    if boxes.size == 0:
+        return np.empty((0, 4), dtype=np.int64)
+    boxes = np.trunc(boxes.reshape(-1, 4, 2)).astype(np.int64)
+    x = boxes[:, :, 0]
+    y = boxes[:, :, 1]
+    return np.stack([np.maximum(x[:, 0], x[:, 3]), np.minimum(x[:, 1], x[:, 2]),
+                     np.maximum(y[:, 0], y[:, 1]), np.minimum(y[:, 2], y[:, 3])], axis=1)
+
+
+def round_y(y, step=LINE_STEP):
+    """
+    Округление координаты до ближайшего кратного step (половина шага округляется вниз)
+    """
+    y = np.asarray(y, dtype=np.int64)
+    lower = y - y % step
+    return lower + step * (y - lower > step // 2)
+
+
+def cluster_lines(y, step=LINE_STEP):
+    """
+    Группировка рамок в строки по верхней границе: округленные значения сортируются, и проход по ним открывает новую строку,
+    когда значение больше начала текущей строки более чем на step
+    :param y верхние границы рамок
+    :return для каждой рамки начало её строки (наименьшая округленная верхняя граница строки)
+    """
+    rounded = round_y(y, step)
+    if len(rounded) == 0:
+        return rounded
+    starts = []
+    for value in np.unique(rounded).tolist():
+        if len(starts) == 0 or value - starts[-1] > step:
+            starts.append(value)
+    starts = np.array(starts, dtype=np.int64)
+    return starts[np.searchsorted(starts, rounded, side='right') - 1]
+
+
+def reading_order(coordinates, step=LINE_STEP):
+    """
+    Порядок чтения рамок: по строкам сверху вниз, внутри строки слева направо (при равных координатах - в исходном порядке)
+    :param coordinates массив N x 4 (xmin, xmax, ymin, ymax)
+    :return (индексы рамок в порядке чтения, начало строки для каждой рамки)
+    """
+    coordinates = np.asarray(coordinates, dtype=np.int64).reshape(-1, 4)
+    lines = cluster_lines(coordinates[:, 2], step)
+    return np.lexsort((coordinates[:, 0], lines)), lines
+
+
+def rank_boxes(dt_box, rec_res, step=LINE_STEP):
+    """
+    Упорядочивание результата OCR в порядке чтения
+    Верхняя граница каждой рамки выравнивается по началу её строки
+    :return (рамки [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)], результаты распознавания) в порядке чтения
+    """
+    count = min(len(dt_box), len(rec_res))
+    if count == 0:
+        return [], []
+    coordinates = box_coordinates(dt_box[:count])
+    order, lines = reading_order(coordinates, step)
+    ranked_box = []
+    for (xmin, xmax, _, ymax), line in zip(coordinates[order].tolist(), lines[order].tolist()):
+        ranked_box.append([(xmin, line), (xmax, line), (xmax, ymax), (xmin, ymax)])
+    return ranked_box, [rec_res[i] for i in order.tolist()]
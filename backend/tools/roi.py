@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Подготовка изображения для OCR: обрезка кадра до области субтитров, адаптивное уменьшение разрешения
+       и пересчет координат результата обратно в систему координат кадра
+"""
+import math
+import cv2
+
+# Минимальный коэффициент уменьшения изображения
+MIN_SCALE = 0.25
+# Шаг коэффициента уменьшения, коэффициент округляется вверх до этого шага, чтобы размер входа модели не менялся от кадра к кадру
+SCALE_STEP = 0.05
+
+
+def get_crop_region(sub_area, frame_height, frame_width, margin):
+    """
+    Область кадра, передаваемая в OCR: область субтитров, расширенная на margin пикселей с каждой стороны
+    и ограниченная размерами кадра
+    :param sub_area область субтитров (ymin, ymax, xmin, xmax)
+    :return (ymin, ymax, xmin, xmax) или None, если область субтитров не указана
+    """
+    if sub_area is None:
+        return None
+    s_ymin, s_ymax, s_xmin, s_xmax = sub_area
+    ymin = max(int(s_ymin) - margin, 0)
+    xmin = max(int(s_xmin) - margin, 0)
+    ymax = int(s_ymax) + margin
+    xmax = int(s_xmax) + margin
+    if frame_height > 0:
+        ymax = min(ymax, frame_height)
+    if frame_width > 0:
+        xmax = min(xmax, frame_width)
+    if ymax <= ymin or xmax <= xmin:
+        return None
+    return ymin, ymax, xmin, xmax
+
+
+def crop(frame, region):
+    """
+    Обрезка кадра до области region (без копирования)
+    """
+    if region is None:
+        return frame
+    ymin, ymax, xmin, xmax = region
+    return frame[ymin:ymax, xmin:xmax]
+
+
+def boxes_to_frame(dt_box, region):
+    """
+    Пересчет координат рамок, найденных на обрезанном кадре, в систему координат исходного кадра
+    """
+    if region is None or dt_box is None or len(dt_box) == 0:
+        return dt_box
+    ymin, _, xmin, _ = region
+    return [[(int(point[0]) + xmin, int(point[1]) + ymin) for point in box] for box in dt_box]
+
+
+def scale_boxes(dt_box, scale):
+    """
+    Пересчет координат рамок, найденных на изображении, уменьшенном в scale раз, в систему координат исходного изображения
+    """
+    if scale == 1 or dt_box is None or len(dt_box) == 0:
+        return dt_box
+    return [[(int(round(point[0] / scale)), int(round(point[1] / scale))) for point in box] for box in dt_box]
+
+
+class AdaptiveScaler:
+    """
+    Адаптивное уменьшение изображения перед OCR.
+    Модель детектирования все равно уменьшает изображение до max_side по большей стороне, а модели распознавания
+    достаточно, чтобы высота текста была не меньше target_text_height, поэтому изображение уменьшается до большего
+    из этих двух масштабов. Высота текста не измеряется, а задается долей text_height_ratio от высоты кадра видео,
+    поэтому коэффициент зависит только от видео, размера изображения и настроек: один и тот же кадр распознается
+    одинаково независимо от предыдущих кадров, количества процессов OCR и продолжения с контрольной точки
+    """
+
+    def __init__(self, target_text_height, max_side, frame_height, text_height_ratio, min_scale=MIN_SCALE):
+        self.target_text_height = target_text_height
+        self.max_side = max_side
+        self.min_scale = min_scale
+        # Ожидаемая высота текста в пикселях исходного изображения, None - высота кадра неизвестна
+        self.text_height = frame_height * text_height_ratio if frame_height > 0 else None
+
+    def get_scale(self, image):
+        """
+        Коэффициент уменьшения изображения, 1 - изображение не уменьшается
+        """
+        if self.text_height is None:
+            return 1.0
+        longest_side = max(image.shape[:2])
+        scale = max(self.max_side / max(longest_side, 1), self.target_text_height / self.text_height, self.min_scale)
+        scale = math.ceil(scale / SCALE_STEP) * SCALE_STEP
+        return 1.0 if scale >= 1 else scale
+
+    def resize(self, image):
+        """
+        Уменьшение изображения
+        :return (изображение, коэффициент уменьшения)
+        """
+        scale = self.get_scale(image)
+        if scale == 1:
+            return image, scale
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
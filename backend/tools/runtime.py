@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Определение устройства выполнения и подготовка файлов моделей.
+       Вызывается из config при первом обращении к зависящим от устройства параметрам, а не при импорте config:
+       импорт paddle и onnxruntime и объединение разделенных файлов моделей занимают несколько секунд
+"""
+import csv
+import functools
+import os
+
+# Поддерживаемые провайдеры ONNX Runtime (кроме CPUExecutionProvider)
+SUPPORTED_ONNX_PROVIDERS = [
+    "DmlExecutionProvider",         # DirectML, для Windows GPU
+    "ROCMExecutionProvider",        # AMD ROCm
+    "MIGraphXExecutionProvider",    # AMD MIGraphX
+    # "VitisAIExecutionProvider",   # AMD VitisAI, для RyzenAI & Windows
+    "OpenVINOExecutionProvider",    # Intel GPU
+    "MetalExecutionProvider",       # Apple macOS
+    "CoreMLExecutionProvider",      # Apple macOS
+    "CUDAExecutionProvider",        # Nvidia GPU
+]
+# Имя файла параметров модели
+MODEL_PARAMS_FILENAME = 'inference.pdiparams'
+# Манифест разделенного файла параметров модели (filesplit)
+SPLIT_MANIFEST_FILENAME = 'fs_manifest.csv'
+# Файл-отметка об успешном объединении файлов модели, при его наличии каталог модели не проверяется
+MERGED_MARKER_FILENAME = '.merged'
+
+
+@functools.lru_cache(maxsize=None)
+def cuda_available():
+    """
+    Доступен ли GPU Nvidia для paddlepaddle
+    """
+    import paddle
+    # Если paddlepaddle скомпилирован с поддержкой GPU, проверить наличие GPU
+    return paddle.is_compiled_with_cuda() and len(paddle.static.cuda_places()) > 0
+
+
+@functools.lru_cache(maxsize=None)
+def onnx_providers():
+    """
+    Провайдеры ONNX Runtime (DirectML/AMD/Intel/Apple)
+    :return (поддерживаемые провайдеры, пропущенные неподдерживаемые провайдеры) или None, если onnxruntime не установлен
+    """
+    try:
+        import onnxruntime as ort
+    except ModuleNotFoundError:
+        return None
+    supported, skipped = [], []
+    for provider in ort.get_available_providers():
+        if provider == "CPUExecutionProvider":
+            continue
+        if provider in SUPPORTED_ONNX_PROVIDERS:
+            supported.append(provider)
+        else:
+            skipped.append(provider)
+    return supported, skipped
+
+
+def default_ocr_worker_num(use_gpu):
+    """
+    Количество процессов OCR по умолчанию: на GPU один процесс, на CPU - по одному процессу на каждые 4 ядра, но не более 8
+    """
+    return 1 if use_gpu else max(1, min((os.cpu_count() or 1) // 4, 8))
+
+
+def _split_size(model_dir):
+    """
+    Суммарный размер частей разделенного файла параметров по манифесту, None - манифеста нет
+    """
+    manifest_path = os.path.join(model_dir, SPLIT_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, mode='r', encoding='utf-8') as f:
+        return sum(int(row['filesize']) for row in csv.DictReader(f))
+
+
+def merge_model(model_dir):
+    """
+    Объединение разделенного файла параметров модели в inference.pdiparams.
+    Выполняется один раз: после объединения создается файл-отметка, и при следующих запусках каталог не проверяется.
+    Файл параметров, размер которого не совпадает с манифестом (прерванное объединение), объединяется заново
+    """
+    if not os.path.isdir(model_dir) or os.path.exists(os.path.join(model_dir, MERGED_MARKER_FILENAME)):
+        return
+    params_path = os.path.join(model_dir, MODEL_PARAMS_FILENAME)
+    split_size = _split_size(model_dir)
+    if not os.path.exists(params_path) or (split_size is not None and os.path.getsize(params_path) != split_size):
+        try:
+            # Для новой версии filesplit (>=4.0.0)
+            from filesplit.merge import Merge
+        except ImportError:
+            Merge = None
+        if Merge is not None:
+            Merge(inputdir=model_dir, outputdir=model_dir, outputfilename='merged_file').merge()
+        else:
+            # Для старой версии filesplit (<4.0.0)
+            from fsplit.filesplit import Filesplit
+            Filesplit().merge(input_dir=model_dir)
+    with open(os.path.join(model_dir, MERGED_MARKER_FILENAME), mode='w', encoding='utf-8'):
+        pass
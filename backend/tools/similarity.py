@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+@desc: Быстрое сравнение изображений (областей субтитров) средствами NumPy/OpenCV
+       Все функции принимают ndarray в том виде, в котором их возвращает cv2 (BGR или градации серого)
+"""
+import cv2
+import numpy as np
+
+# Ширина уменьшенного изображения для сравнения
+THUMB_WIDTH = 320
+# Минимальная высота уменьшенного изображения
+THUMB_MIN_HEIGHT = 16
+
+
+def to_thumbnail(image, width=THUMB_WIDTH):
+    """
+    Преобразование BGR (или серого) изображения в уменьшенное изображение в градациях серого с сохранением пропорций
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    h, w = image.shape[:2]
+    height = max(THUMB_MIN_HEIGHT, int(round(h * width / max(w, 1))))
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def gray_difference(thumb1, thumb2):
+    """
+    Средняя абсолютная разница яркости двух уменьшенных изображений, нормированная в диапазон [0, 1]
+    """
+    return float(cv2.absdiff(thumb1, thumb2).mean()) / 255
+
+
+def edge_difference(thumb1, thumb2):
+    """
+    Доля пикселей, различающихся на картах границ двух уменьшенных изображений, в диапазоне [0, 1]
+    Карта границ текста субтитров устойчива к изменению яркости фона
+    """
+    edge1 = cv2.Canny(thumb1, 100, 200) > 0
+    edge2 = cv2.Canny(thumb2, 100, 200) > 0
+    return float(np.count_nonzero(edge1 != edge2)) / edge1.size
+
+
+def _as_vector(thumb):
+    vector = thumb.astype(np.float32).ravel()
+    return vector
+
+
+def cosine_similarity(image1, image2):
+    """
+    Косинусное сходство двух изображений (BGR или серых) в диапазоне [0, 1]
+    """
+    return float(cosine_similarity_batch(image1, [image2])[0])
+
+
+def cosine_similarity_batch(image, candidates):
+    """
+    Косинусное сходство одного изображения с K изображениями-кандидатами за одно матричное умножение
+    :return массив из K значений сходства
+    """
+    reference = to_thumbnail(image)
+    vector = _as_vector(reference)
+    matrix = _stack_candidates(reference, candidates)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+    dots = matrix @ vector
+    return np.divide(dots, norms, out=np.ones_like(dots), where=norms > 0)
+
+
+def ssim_similarity(image1, image2):
+    """
+    Упрощенный SSIM (по одному окну на всё изображение) двух изображений в диапазоне [-1, 1]
+    """
+    return float(ssim_similarity_batch(image1, [image2])[0])
+
+
+def ssim_similarity_batch(image, candidates):
+    """
+    Упрощенный SSIM одного изображения с K изображениями-кандидатами: средние, дисперсии и ковариация считаются векторно по всем кандидатам
+    :return массив из K значений сходства
+    """
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    reference = to_thumbnail(image)
+    x = _as_vector(reference)
+    ys = _stack_candidates(reference, candidates)
+    mu_x = x.mean()
+    mu_y = ys.mean(axis=1)
+    var_x = x.var()
+    var_y = ys.var(axis=1)
+    cov = ((ys - mu_y[:, None]) * (x - mu_x)).mean(axis=1)
+    return ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / ((mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2))
+
+
+def phash(image, hash_size=8):
+    """
+    Перцептивный хэш изображения (DCT): массив из hash_size*hash_size бит
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    size = hash_size * 4
+    resized = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = cv2.dct(resized)[:hash_size, :hash_size]
+    return (dct > np.median(dct)).ravel()
+
+
+def phash_similarity(image1, image2):
+    """
+    Сходство по перцептивному хэшу: 1 - нормированное расстояние Хэмминга, в диапазоне [0, 1]
+    """
+    return float(phash_similarity_batch(image1, [image2])[0])
+
+
+def phash_similarity_batch(image, candidates):
+    """
+    Сходство по перцептивному хэшу одного изображения с K изображениями-кандидатами
+    :return массив из K значений сходства
+    """
+    reference = phash(image)
+    hashes = np.stack([phash(candidate) for candidate in candidates])
+    return 1 - np.count_nonzero(hashes != reference, axis=1) / reference.size
+
+
+def _stack_candidates(reference, candidates):
+    """
+    Приведение кандидатов к размеру уменьшенного эталонного изображения и объединение в матрицу K x N
+    """
+    height, width = reference.shape[:2]
+    thumbs = []
+    for candidate in candidates:
+        thumb = to_thumbnail(candidate, width)
+        if thumb.shape != reference.shape:
+            thumb = cv2.resize(thumb, (width, height), interpolation=cv2.INTER_AREA)
+        thumbs.append(_as_vector(thumb))
+    return np.stack(thumbs)
+
+
+SIMILARITY_METRICS = {
+    'cosine': cosine_similarity,
+    'ssim': ssim_similarity,
+    'phash': phash_similarity,
+}
+
+SIMILARITY_BATCH_METRICS = {
+    'cosine': cosine_similarity_batch,
+    'ssim': ssim_similarity_batch,
+    'phash': phash_similarity_batch,
+}
+
+
+def compute_similarity(image1, image2, mode='cosine'):
+    """
+    Сходство двух изображений (ndarray, как их возвращает cv2) в выбранном режиме: cosine, ssim или phash
+    """
+    if mode not in SIMILARITY_METRICS:
+        raise ValueError(f'Неизвестный режим сходства: {mode}')
+    return SIMILARITY_METRICS[mode](image1, image2)
+
+
+def compute_similarity_batch(image, candidates, mode='cosine'):
+    """
+    Сходство одного изображения с K изображениями-кандидатами в выбранном режиме
+    :return массив из K значений сходства
+    """
+    if mode not in SIMILARITY_BATCH_METRICS:
+        raise ValueError(f'Неизвестный режим сходства: {mode}')
+    if len(candidates) == 0:
+        return np.empty(0, dtype=np.float32)
+    return SIMILARITY_BATCH_METRICS[mode](image, candidates)
+
+
+DIFF_METRICS = {
+    'gray': gray_difference,
+    'edge': edge_difference,
+    'cosine': lambda thumb1, thumb2: 1 - cosine_similarity(thumb1, thumb2),
+    'ssim': lambda thumb1, thumb2: 1 - ssim_similarity(thumb1, thumb2),
+    'phash': lambda thumb1, thumb2: 1 - phash_similarity(thumb1, thumb2),
+}
+
+
+class FrameChangeDetector:
+    """
+    Детектор изменения области субтитров: сравнивает текущий кадр с последним кадром, для которого выполнялось OCR.
+    Если разница ниже порога, текст считается неизменным и OCR можно не выполнять
+    """
+
+    def __init__(self, threshold, mode='edge'):
+        if mode not in DIFF_METRICS:
+            raise ValueError(f'Неизвестный режим сравнения: {mode}')
+        self.threshold = threshold
+        self.metric = DIFF_METRICS[mode]
+        self.reference = None
+
+    def set_reference(self, image):
+        """
+        Запоминание изображения последнего распознанного кадра
+        """
+        self.reference = to_thumbnail(image)
+
+    def reset(self):
+        self.reference = None
+
+    def is_changed(self, image):
+        """
+        Изменилось ли изображение по сравнению с последним распознанным кадром
+        """
+        if self.reference is None:
+            return True
+        thumb = to_thumbnail(image)
+        if thumb.shape != self.reference.shape:
+            return True
+        return self.metric(self.reference, thumb) > self.threshold
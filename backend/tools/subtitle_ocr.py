@@ -1,20 +1,72 @@
+import io
+import json
 import os
 import re
-from multiprocessing import Queue, Process
+import time
+import traceback
+from multiprocessing import Process, Value
 import cv2
 from PIL import ImageFont, ImageDraw, Image
 from tqdm import tqdm
 from backend.tools.ocr import OcrRecogniser, get_coordinates
 from backend.tools.constant import SubtitleArea
 from backend.tools import constant
-from threading import Thread
+from backend.tools.roi import AdaptiveScaler, scale_boxes
+from backend.tools.decoder import open_video
+from backend.tools.raw_store import format_line
+from backend.tools.box_utils import overflow_area_rate as compute_overflow_area_rate
+from backend.tools.pipeline_metrics import MeteredQueue, QueueMetrics, bounded_queue, print_report
+from threading import Thread, Lock
 import queue
-from shapely.geometry import Polygon
 from types import SimpleNamespace
 import shutil
 import numpy as np
 from collections import namedtuple
 
+# 检查点任务的帧号，任务中的dt_box字段携带主进程的提取状态
+CHECKPOINT_FRAME_NO = -2
+# 主进程等待队列空位时检查OCR进程状态的间隔（秒）
+PUT_TIMEOUT = 1
+
+
+def get_checkpoint_path(raw_subtitle_path):
+    """
+    检查点文件与原始字幕文件位于同一目录
+    """
+    return os.path.join(os.path.dirname(raw_subtitle_path), 'checkpoint.json')
+
+
+def save_checkpoint(raw_subtitle_path, raw_offset, state):
+    """
+    写入检查点：原始字幕文件中已完整写入的字节数与对应的主进程提取状态
+    先写入临时文件再替换，进程中途被杀死也不会留下损坏的检查点
+    """
+    checkpoint_path = get_checkpoint_path(raw_subtitle_path)
+    with open(checkpoint_path + '.tmp', mode='w', encoding='utf-8') as f:
+        json.dump({'raw_offset': raw_offset, 'state': state}, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+
+def load_checkpoint(raw_subtitle_path):
+    """
+    读取检查点
+    :return (raw_offset, state)，没有检查点或原始字幕文件时返回None
+    """
+    checkpoint_path = get_checkpoint_path(raw_subtitle_path)
+    if not os.path.exists(checkpoint_path) or not os.path.exists(raw_subtitle_path):
+        return None
+    with open(checkpoint_path, mode='r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if os.path.getsize(raw_subtitle_path) < checkpoint['raw_offset']:
+        return None
+    return checkpoint['raw_offset'], checkpoint['state']
+
+
+# 字幕区域过滤的调试信息
+LossInfo = namedtuple('loss_info', 'text prob overflow_area_rate coordinate selected')
+
 
 def extract_subtitles(data, text_recogniser, img, raw_subtitle_file,
                       sub_area, options, dt_box_arg, rec_res_arg, ocr_loss_debug_path):
@@ -38,34 +90,27 @@ def extract_subtitles(data, text_recogniser, img, raw_subtitle_file,
         text_res = [(res[0], res[1]) for res in rec_res]
     line = ''
     loss_list = []
-    for content, coordinate in zip(text_res, coordinates):
+    if sub_area is not None:
+        # 一次计算本帧所有文本框与用户指定字幕区域的交集及越界比例（没有交集的文本框越界比例为0）
+        intersects, overflow_area_rates = compute_overflow_area_rate(sub_area, coordinates)
+    for index, (content, coordinate) in enumerate(zip(text_res, coordinates)):
         text = content[0]
         prob = content[1]
         if sub_area is not None:
             selected = False
-            # 初始化超界偏差为0
-            overflow_area_rate = 0
-            # 用户指定的字幕区域
-            sub_area_polygon = sub_area_to_polygon(sub_area)
-            # 识别出的字幕区域
-            coordinate_polygon = coordinate_to_polygon(coordinate)
-            # 计算两个区域是否有交集交集
-            intersection = sub_area_polygon.intersection(coordinate_polygon)
+            overflow_area_rate = float(overflow_area_rates[index])
             # 如果有交集
-            if not intersection.is_empty:
-                # 计算越界允许偏差
-                overflow_area_rate = ((sub_area_polygon.area + coordinate_polygon.area - intersection.area) / sub_area_polygon.area) - 1
+            if intersects[index]:
                 # 如果越界比例低于设定阈值且该行文本识别的置信度高于设定阈值
                 if overflow_area_rate <= options.SUB_AREA_DEVIATION_RATE and prob > options.DROP_SCORE:
                     # 保留该帧
                     selected = True
-                    line += f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n'
-                    raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n')
+                    line += format_line(data["i"], coordinate, text, prob)
+                    raw_subtitle_file.write(format_line(data["i"], coordinate, text, prob))
             # 保存丢掉的识别结果
-            loss_info = namedtuple('loss_info', 'text prob overflow_area_rate coordinate selected')
-            loss_list.append(loss_info(text, prob, overflow_area_rate, coordinate, selected))
+            loss_list.append(LossInfo(text, prob, overflow_area_rate, coordinate, selected))
         else:
-            raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n')
+            raw_subtitle_file.write(format_line(data["i"], coordinate, text, prob))
     # 输出调试信息
     dump_debug_info(options, line, img, loss_list, ocr_loss_debug_path, sub_area, data)
 
@@ -87,22 +132,6 @@ def dump_debug_info(options, line, img, loss_list, ocr_loss_debug_path, sub_area
         cv2.imwrite(os.path.join(os.path.abspath(ocr_loss_debug_path), f'{str(data["i"]).zfill(8)}.png'), img)
 
 
-def sub_area_to_polygon(sub_area):
-    s_ymin = sub_area[0]
-    s_ymax = sub_area[1]
-    s_xmin = sub_area[2]
-    s_xmax = sub_area[3]
-    return Polygon([[s_xmin, s_ymin], [s_xmax, s_ymin], [s_xmax, s_ymax], [s_xmin, s_ymax]])
-
-
-def coordinate_to_polygon(coordinate):
-    xmin = coordinate[0]
-    xmax = coordinate[1]
-    ymin = coordinate[2]
-    ymax = coordinate[3]
-    return Polygon([[xmin, ymin], [xmax, ymin], [xmax, ymax], [xmin, ymax]])
-
-
 FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotoSansCJK-Bold.otf')
 FONT = ImageFont.truetype(FONT_PATH, 20)
 
@@ -117,106 +146,291 @@ def paint_chinese_opencv(im, chinese, pos, color):
     return img
 
 
-def ocr_task_consumer(ocr_queue, raw_subtitle_path, sub_area, video_path, options):
+def ocr_task_consumer(ocr_queue, result_queue, sub_area, video_path, options, frame_ring=None, error_flag=None):
     """
-    消费者： 消费ocr_queue，将ocr队列中的数据取出，进行ocr识别，写入字幕文件中
-    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果)
-    :param raw_subtitle_path
+    消费者： 消费ocr_queue，将ocr队列中的数据取出，进行ocr识别，将识别结果按任务序号发送给写入进程
+    :param ocr_queue (seq任务序号, total_frame_count总帧数, current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果, frame_ref共享内存帧引用)
+    :param result_queue (seq任务序号, total_frame_count总帧数, current_frame_no当前帧帧号, text写入原始字幕文件的文本)
     :param sub_area
     :param video_path
     :param options
+    :param frame_ring 共享内存帧环形缓冲区
+    :param error_flag 所有OCR进程共享的错误标志，出错时置1，主进程据此停止等待
     """
     data = {'i': 1}
-    # 初始化文本识别对象
-    text_recogniser = OcrRecogniser()
+    # 在本进程中进行OCR识别的帧数，主进程已经识别过的帧直接复用其结果
+    ocr_count = 0
+    # 文本识别对象，只有在需要本进程识别时才加载模型
+    text_recogniser = None
+    # 根据视频帧高度估计的文字高度缩小待识别的图像
+    scaler = None
+    if getattr(options, 'OCR_TARGET_TEXT_HEIGHT', None) is not None:
+        scaler = AdaptiveScaler(options.OCR_TARGET_TEXT_HEIGHT, options.OCR_MAX_INPUT_SIDE, options.FRAME_HEIGHT,
+                                options.OCR_EXPECTED_TEXT_HEIGHT_RATIO)
     # 丢失字幕的存储路径
     ocr_loss_debug_path = os.path.join(os.path.abspath(os.path.splitext(video_path)[0]), 'loss')
-    # 删除之前的缓存垃圾
-    if os.path.exists(ocr_loss_debug_path):
-        shutil.rmtree(ocr_loss_debug_path, True)
 
-    with open(raw_subtitle_path, mode='w+', encoding='utf-8') as raw_subtitle_file:
-        while True:
-            try:
-                frame_no, frame, dt_box, rec_res = ocr_queue.get(block=True)
-                if frame_no == -1:
-                    return
-                data['i'] = frame_no
-                extract_subtitles(data, text_recogniser, frame, raw_subtitle_file, sub_area, options, dt_box,
-                                  rec_res, ocr_loss_debug_path)
-            except Exception as e:
-                print(e)
-                break
+    batch = None
+    # 本批中已经开始处理的任务数，之后任务的共享内存帧在异常时统一释放
+    processed = 0
+    finished = False
+    while True:
+        try:
+            processed = 0
+            # 累积一批关键帧，直到达到批大小或超过等待时间
+            batch = [ocr_queue.get(block=True)]
+            deadline = time.time() + options.OCR_BATCH_TIMEOUT
+            while batch[-1][2] != -1 and len(batch) < options.OCR_BATCH_SIZE:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(ocr_queue.get(block=True, timeout=timeout))
+                except queue.Empty:
+                    break
+            finished = batch[-1][2] == -1
+            if finished:
+                batch.pop()
+            # 主进程没有给出识别结果的帧，在本进程中批量识别
+            predict_results = {}
+            to_predict = [i for i, item in enumerate(batch)
+                          if item[2] != CHECKPOINT_FRAME_NO and (item[4] is None or item[5] is None)]
+            if len(to_predict) > 0:
+                if text_recogniser is None:
+                    # 初始化文本识别对象
+                    text_recogniser = OcrRecogniser()
+                if scaler is None:
+                    predict_results = dict(zip(to_predict, text_recogniser.predict_batch([batch[i][3] for i in to_predict])))
+                else:
+                    scaled = [scaler.resize(batch[i][3]) for i in to_predict]
+                    batch_results = text_recogniser.predict_batch([image for image, _ in scaled])
+                    for i, (_, scale), (dt_box, rec_res) in zip(to_predict, scaled, batch_results):
+                        # 坐标换算回原始帧，保证原始字幕文件中的坐标不受缩放影响
+                        predict_results[i] = (scale_boxes(dt_box, scale), rec_res)
+                ocr_count += len(to_predict)
+            for i, (seq, total_frame_count, frame_no, frame, dt_box, rec_res, frame_ref) in enumerate(batch):
+                processed = i + 1
+                try:
+                    # 检查点任务原样转发给写入进程
+                    if frame_no == CHECKPOINT_FRAME_NO:
+                        result_queue.put((seq, total_frame_count, frame_no, dt_box))
+                        continue
+                    data['i'] = frame_no
+                    if i in predict_results:
+                        dt_box, rec_res = predict_results[i]
+                    raw_subtitle_buffer = io.StringIO()
+                    extract_subtitles(data, text_recogniser, frame, raw_subtitle_buffer, sub_area, options, dt_box,
+                                      rec_res, ocr_loss_debug_path)
+                    result_queue.put((seq, total_frame_count, frame_no, raw_subtitle_buffer.getvalue()))
+                finally:
+                    # 无论识别是否成功都释放共享内存中的帧，否则主进程会一直等待空闲槽位
+                    if frame_ref is not None:
+                        frame = None
+                        frame_ring.release(frame_ref)
+            batch = None
+            if finished:
+                print(f"OCR: распознано кадров в процессе OCR {ocr_count}")
+                return
+        except Exception:
+            traceback.print_exc()
+            set_error(error_flag)
+            # 释放本批中尚未处理的任务的共享内存帧
+            if batch is not None:
+                release_frames(frame_ring, batch[processed:])
+            # 继续取出OCR队列中剩余的任务直到结束标志，生产者线程与主进程不会因队列已满而一直等待
+            if not finished:
+                drain_ocr_queue(ocr_queue, frame_ring)
+            return
+
+
+def set_error(error_flag):
+    """
+    通知主进程OCR进程出错
+    """
+    if error_flag is not None:
+        error_flag.value = 1
+
 
+def drain_ocr_queue(ocr_queue, frame_ring):
+    """
+    丢弃OCR队列中的任务并释放其共享内存帧，直到遇到结束标志
+    """
+    while True:
+        item = ocr_queue.get(block=True)
+        if item[2] == -1:
+            return
+        release_frames(frame_ring, [item])
 
-def ocr_task_producer(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path):
+
+def release_frames(frame_ring, items):
+    """
+    释放OCR队列任务中引用的共享内存帧
+    :param items OCR队列中的任务，最后一个字段为frame_ref共享内存帧引用
+    """
+    for item in items:
+        if item[-1] is not None:
+            frame_ring.release(item[-1])
+
+
+def ocr_task_producer(ocr_queue, task_queue, video_path, options, frame_ring=None, error_flag=None):
     """
     生产者：负责生产用于OCR识别的数据，将需要进行ocr识别的数据加入ocr_queue中
-    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果)
-    :param task_queue (total_frame_count总帧数, current_frame_no当前帧帧号, dt_box检测框, rec_res识别结果, subtitle_area字幕区域)
-    :param progress_queue
+    :param ocr_queue (seq任务序号, total_frame_count总帧数, current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果, frame_ref共享内存帧引用)
+    :param task_queue (seq任务序号, total_frame_count总帧数, current_frame_no当前帧帧号, dt_box检测框, rec_res识别结果, total_ms当前帧时间, subtitle_area字幕区域, frame_ref共享内存帧引用)
     :param video_path
-    :param raw_subtitle_path
+    :param options
+    :param frame_ring 共享内存帧环形缓冲区，主进程已解码的帧通过它传递，无需重新seek解码
+    :param error_flag 所有OCR进程共享的错误标志
     """
-    cap = cv2.VideoCapture(video_path)
-    tbar = None
-    while True:
-        try:
-            # 从任务队列中提取任务信息
-            total_frame_count, current_frame_no, dt_box, rec_res, total_ms, default_subtitle_area = task_queue.get(block=True)
-            progress_queue.put(current_frame_no)
-            if tbar is None:
-                tbar = tqdm(total=round(total_frame_count), position=1)
+    cap = None
+    # 是否已向OCR队列发送结束标志，出错退出时也必须发送，否则消费者线程会一直等待
+    finished = False
+    try:
+        while True:
+            frame_ref = None
+            # 从任务队列中提取任务信息，任务序号由主进程按放入顺序分配
+            seq, total_frame_count, current_frame_no, dt_box, rec_res, total_ms, default_subtitle_area, frame_ref = task_queue.get(block=True)
             # current_frame 等于-1说明所有视频帧已经读完
             if current_frame_no == -1:
+                # 将结束标志放回任务队列，通知其他OCR进程
+                task_queue.put((seq, total_frame_count, -1, None, None, None, None, None))
                 # ocr识别队列加入结束标志
-                ocr_queue.put((-1, None, None, None))
-                # 更新进度条
-                tbar.update(tbar.total - tbar.n)
+                ocr_queue.put((seq, total_frame_count, -1, None, None, None, None))
+                finished = True
                 break
-            tbar.update(round(current_frame_no - tbar.n))
-            # 设置当前视频帧
-            # 如果total_ms不为空，则使用了VSF提取字幕
-            if total_ms is not None:
-                cap.set(cv2.CAP_PROP_POS_MSEC, total_ms)
-            else:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame_no - 1)
-            # 读取视频帧
-            ret, frame = cap.read()
+            # 检查点任务不需要读取视频帧
+            if current_frame_no == CHECKPOINT_FRAME_NO:
+                ocr_queue.put((seq, total_frame_count, current_frame_no, None, dt_box, None, None))
+                continue
+            # 主进程已经解码并裁剪过该帧，直接从共享内存中读取
+            if frame_ref is not None:
+                ocr_queue.put((seq, total_frame_count, current_frame_no, frame_ring.get(frame_ref), dt_box, rec_res,
+                               frame_ref))
+                continue
+            # 主进程已经给出识别结果，且不需要输出调试图片，则无需读取视频帧
+            if dt_box is not None and rec_res is not None and not options.DEBUG_OCR_LOSS:
+                ocr_queue.put((seq, total_frame_count, current_frame_no, None, dt_box, rec_res, None))
+                continue
+            if cap is None:
+                cap = open_video(video_path, getattr(options, 'DECODER_BACKEND', 'opencv'),
+                                 getattr(options, 'DECODER_THREADS', 0))
+            frame = read_task_frame(cap, current_frame_no, total_ms, default_subtitle_area)
             # 如果读取成功
-            if ret:
-                # 根据默认字幕位置，则对视频帧进行裁剪，裁剪后处理
-                if default_subtitle_area is not None:
-                    frame = frame_preprocess(default_subtitle_area, frame)
-                ocr_queue.put((current_frame_no, frame, dt_box, rec_res))
-        except Exception as e:
-            print(e)
-            break
-    cap.release()
+            if frame is not None:
+                ocr_queue.put((seq, total_frame_count, current_frame_no, frame, dt_box, rec_res, None))
+            else:
+                # 读取失败也要发送空结果，否则写入进程会一直等待该序号
+                ocr_queue.put((seq, total_frame_count, current_frame_no, None, [], [], None))
+    except Exception:
+        traceback.print_exc()
+        set_error(error_flag)
+        # 释放尚未交给消费者线程的共享内存帧
+        if frame_ref is not None:
+            frame_ring.release(frame_ref)
+    finally:
+        if not finished:
+            ocr_queue.put((None, None, -1, None, None, None, None))
+        if cap is not None:
+            cap.release()
 
 
-def subtitle_extract_handler(task_queue, progress_queue, video_path, raw_subtitle_path, sub_area, options):
+def read_task_frame(cap, current_frame_no, total_ms, subtitle_area):
     """
-    创建并开启一个视频帧提取线程与一个ocr识别线程
-    :param task_queue 任务队列，(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, subtitle_area字幕区域)
-    :param progress_queue 进度队列
+    定位并读取任务对应的视频帧，并根据默认字幕位置进行裁剪
+    :return 视频帧，读取失败返回None
+    """
+    # 设置当前视频帧
+    # 如果total_ms不为空，则使用了VSF提取字幕
+    if total_ms is not None:
+        cap.set(cv2.CAP_PROP_POS_MSEC, total_ms)
+    else:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame_no - 1)
+    # 读取视频帧
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    # 根据默认字幕位置，则对视频帧进行裁剪，裁剪后处理
+    if subtitle_area is not None:
+        frame = frame_preprocess(subtitle_area, frame)
+    return frame
+
+
+class InlineTaskWriter:
+    """
+    在当前进程中处理OCR任务并直接写入原始字幕文件，接口与任务队列相同(put)
+    用于分段并行提取与批量处理：每个进程写入自己的原始字幕文件，不再启动OCR进程与写入进程
+    """
+
+    def __init__(self, video_path, raw_subtitle_path, sub_area, options, text_recogniser=None):
+        self.video_path = video_path
+        self.sub_area = sub_area
+        self.options = SimpleNamespace(**options)
+        self.raw_subtitle_file = open(raw_subtitle_path, mode='w', encoding='utf-8')
+        # 丢失字幕的存储路径
+        self.ocr_loss_debug_path = os.path.join(os.path.abspath(os.path.splitext(video_path)[0]), 'loss')
+        self.data = {'i': 1}
+        # 文本识别对象与视频读取对象，只有在任务缺少识别结果或需要输出调试信息时才创建
+        # 批量处理时传入进程中已加载的识别对象，避免重复加载模型
+        self.text_recogniser = text_recogniser
+        self.cap = None
+
+    def put(self, task, block=True):
+        total_frame_count, current_frame_no, dt_box, rec_res, total_ms, default_subtitle_area, frame_ref = task
+        # current_frame 等于-1说明所有视频帧已经读完
+        if current_frame_no == -1:
+            self.close()
+            return
+        # 分段提取不支持从检查点继续
+        if current_frame_no == CHECKPOINT_FRAME_NO:
+            return
+        frame = None
+        if dt_box is None or rec_res is None or self.options.DEBUG_OCR_LOSS:
+            if self.cap is None:
+                self.cap = open_video(self.video_path, getattr(self.options, 'DECODER_BACKEND', 'opencv'),
+                                      getattr(self.options, 'DECODER_THREADS', 0))
+            frame = read_task_frame(self.cap, current_frame_no, total_ms, default_subtitle_area)
+            if frame is None:
+                dt_box, rec_res = [], []
+            elif dt_box is None or rec_res is None:
+                if self.text_recogniser is None:
+                    self.text_recogniser = OcrRecogniser()
+                dt_box, rec_res = self.text_recogniser.predict(frame)
+        self.data['i'] = current_frame_no
+        extract_subtitles(self.data, self.text_recogniser, frame, self.raw_subtitle_file, self.sub_area, self.options,
+                          dt_box, rec_res, self.ocr_loss_debug_path)
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        if not self.raw_subtitle_file.closed:
+            self.raw_subtitle_file.close()
+
+
+def subtitle_extract_handler(task_queue, result_queue, video_path, sub_area, options, frame_ring=None,
+                             ocr_queue_metrics=None, error_flag=None):
+    """
+    OCR工作进程：创建并开启一个视频帧提取线程与一个ocr识别线程
+    :param task_queue 任务队列，(seq任务序号, total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, total_ms当前帧时间, subtitle_area字幕区域, frame_ref共享内存帧引用)
+    :param result_queue 识别结果队列
     :param video_path 视频路径
-    :param raw_subtitle_path 原始字幕文件路径
     :param sub_area 字幕区域
     :param options 选项
+    :param frame_ring 共享内存帧环形缓冲区
+    :param ocr_queue_metrics OCR队列的统计，所有工作进程共享
+    :param error_flag 所有OCR进程共享的错误标志
     """
-    # 删除缓存
-    if os.path.exists(raw_subtitle_path):
-        os.remove(raw_subtitle_path)
-    # 创建一个OCR队列，大小建议值8-20
-    ocr_queue = queue.Queue(20)
+    # 创建一个OCR队列，大小建议值8-20，队列满时生产者线程等待，不再读取任务
+    ocr_queue = queue.Queue(options.OCR_QUEUE_SIZE)
+    if ocr_queue_metrics is not None:
+        ocr_queue = MeteredQueue(ocr_queue, ocr_queue_metrics)
     # 创建一个OCR事件生产者线程
     ocr_event_producer_thread = Thread(target=ocr_task_producer,
-                                       args=(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path,),
+                                       args=(ocr_queue, task_queue, video_path, options, frame_ring, error_flag,),
                                        daemon=True)
     # 创建一个OCR事件消费者提取线程
     ocr_event_consumer_thread = Thread(target=ocr_task_consumer,
-                                       args=(ocr_queue, raw_subtitle_path, sub_area, video_path, options,),
+                                       args=(ocr_queue, result_queue, sub_area, video_path, options, frame_ring, error_flag,),
                                        daemon=True)
     # 开启消费者线程
     ocr_event_producer_thread.start()
@@ -225,42 +439,201 @@ def subtitle_extract_handler(task_queue, progress_queue, video_path, raw_subtitl
     # join方法让主线程任务结束之后，进入阻塞状态，一直等待其他的子线程执行结束之后，主线程再终止
     ocr_event_producer_thread.join()
     ocr_event_consumer_thread.join()
+    # 通知写入进程本工作进程已结束
+    result_queue.put((None, None, -1, None))
+    if frame_ring is not None:
+        frame_ring.close()
 
 
-def async_start(video_path, raw_subtitle_path, sub_area, options):
+def subtitle_write_handler(result_queue, progress_queue, raw_subtitle_path, worker_num, resume=False):
+    """
+    写入进程：将各OCR工作进程的识别结果按任务序号重新排序后写入原始字幕文件
+    按顺序遇到检查点任务时，之前的所有任务都已写入，此时记录检查点
+    :param result_queue 识别结果队列，(seq任务序号, total_frame_count总帧数, current_frame_no当前帧, text文本)
+    :param progress_queue 进度队列
+    :param raw_subtitle_path 原始字幕文件路径
+    :param worker_num OCR工作进程数
+    :param resume 从检查点继续时追加写入原始字幕文件
+    """
+    # 等待写入的乱序结果
+    pending = {}
+    next_seq = 0
+    finished_worker_num = 0
+    tbar = None
+    with open(raw_subtitle_path, mode='a' if resume else 'w', encoding='utf-8') as raw_subtitle_file:
+        while finished_worker_num < worker_num:
+            seq, total_frame_count, current_frame_no, text = result_queue.get(block=True)
+            if seq is None:
+                finished_worker_num += 1
+                continue
+            pending[seq] = (current_frame_no, text)
+            if tbar is None:
+                tbar = tqdm(total=round(total_frame_count), position=1)
+            while next_seq in pending:
+                frame_no, text = pending.pop(next_seq)
+                next_seq += 1
+                if frame_no == CHECKPOINT_FRAME_NO:
+                    raw_subtitle_file.flush()
+                    os.fsync(raw_subtitle_file.fileno())
+                    save_checkpoint(raw_subtitle_path, raw_subtitle_file.tell(), text)
+                    continue
+                raw_subtitle_file.write(text)
+                progress_queue.put(frame_no)
+                tbar.update(round(frame_no - tbar.n))
+        # 工作进程异常退出时可能缺少部分序号，剩余结果按序号写入
+        for seq in sorted(pending):
+            if pending[seq][0] != CHECKPOINT_FRAME_NO:
+                raw_subtitle_file.write(pending[seq][1])
+    if tbar is not None:
+        tbar.update(tbar.total - tbar.n)
+    progress_queue.put(-1)
+
+
+class SequencedTaskQueue:
+    """
+    主进程一侧的任务队列，按放入顺序为任务分配序号，接口与任务队列相同(put)
+    OCR工作进程取任务时不再需要共享锁，写入进程按序号重新组装识别结果
+    """
+
+    def __init__(self, task_queue):
+        self.queue = task_queue
+        self.seq = 0
+        self.lock = Lock()
+
+    def put(self, task, block=True, timeout=None):
+        with self.lock:
+            self.queue.put((self.seq, *task), block, timeout)
+            # 结束标志不占用序号
+            if task[1] != -1:
+                self.seq += 1
+
+
+class OcrProcessPool:
+    """
+    OCR工作进程与写入进程的集合
+    """
+
+    def __init__(self, processes, queue_metrics=None, error_flag=None):
+        self.processes = processes
+        # 各级队列的统计
+        self.queue_metrics = queue_metrics if queue_metrics is not None else []
+        # OCR工作进程共享的错误标志
+        self.error_flag = error_flag
+
+    def join(self):
+        # 某个进程异常退出时，写入进程收不到它的结束标志，因此等待期间检查各进程的退出码
+        for p in self.processes:
+            while p.is_alive():
+                p.join(PUT_TIMEOUT)
+                if any(other.exitcode not in (None, 0) for other in self.processes):
+                    raise RuntimeError('Процесс OCR завершился с ошибкой')
+
+    def is_alive(self):
+        return any(p.is_alive() for p in self.processes)
+
+    def raise_for_error(self):
+        """
+        OCR工作进程出错时抛出异常
+        """
+        if self.error_flag is not None and self.error_flag.value:
+            raise RuntimeError('Ошибка в процессе OCR, подробности выведены выше')
+
+    def check(self):
+        """
+        主进程等待队列空位时调用：OCR进程出错或提前退出时抛出异常，而不是一直等待
+        """
+        self.raise_for_error()
+        if not all(p.is_alive() for p in self.processes):
+            raise RuntimeError('Процесс OCR неожиданно завершился')
+
+    def terminate(self):
+        """
+        停止所有仍在运行的进程
+        """
+        for p in self.processes:
+            if p.is_alive():
+                p.terminate()
+        for p in self.processes:
+            p.join()
+
+    def print_metrics(self):
+        """
+        输出各级队列的深度与等待时间，用于判断流水线中的瓶颈
+        """
+        print_report(self.queue_metrics)
+
+
+def async_start(video_path, raw_subtitle_path, sub_area, options, frame_ring=None, worker_num=1, resume_offset=None):
     """
     开始进程处理异步任务
+    frame_ring 不为空时，主进程解码的帧通过共享内存传入OCR进程，视频只需解码一次
+    worker_num OCR工作进程数，每个进程拥有自己的识别模型，从同一个任务队列中获取任务
+    resume_offset 从检查点继续时原始字幕文件保留的字节数，之后的内容被截断，新结果追加写入
     options.REC_CHAR_TYPE
     options.DROP_SCORE
     options.SUB_AREA_DEVIATION_RATE
     options.DEBUG_OCR_LOSS
+    options.TASK_QUEUE_SIZE, options.OCR_QUEUE_SIZE, options.RESULT_QUEUE_SIZE 各级队列大小，
+    所有队列都有上限，下游处理不过来时上游阻塞等待，长视频处理时内存不会持续增长
     """
     assert 'REC_CHAR_TYPE' in options, "options缺少参数：REC_CHAR_TYPE"
     assert 'DROP_SCORE' in options, "options缺少参数: DROP_SCORE'"
     assert 'SUB_AREA_DEVIATION_RATE' in options, "options缺少参数: SUB_AREA_DEVIATION_RATE"
     assert 'DEBUG_OCR_LOSS' in options, "options缺少参数: DEBUG_OCR_LOSS"
+    assert 'TASK_QUEUE_SIZE' in options, "options缺少参数: TASK_QUEUE_SIZE"
+    assert 'OCR_QUEUE_SIZE' in options, "options缺少参数: OCR_QUEUE_SIZE"
+    assert 'RESULT_QUEUE_SIZE' in options, "options缺少参数: RESULT_QUEUE_SIZE"
+    worker_num = max(int(worker_num), 1)
+    # 删除缓存
+    if resume_offset is not None:
+        # 截断检查点之后写入的不完整结果
+        with open(raw_subtitle_path, mode='r+b') as f:
+            f.truncate(resume_offset)
+    else:
+        if os.path.exists(raw_subtitle_path):
+            os.remove(raw_subtitle_path)
+        if os.path.exists(get_checkpoint_path(raw_subtitle_path)):
+            os.remove(get_checkpoint_path(raw_subtitle_path))
+    # 删除之前的丢失字幕调试缓存
+    ocr_loss_debug_path = os.path.join(os.path.abspath(os.path.splitext(video_path)[0]), 'loss')
+    if os.path.exists(ocr_loss_debug_path):
+        shutil.rmtree(ocr_loss_debug_path, True)
     # 创建一个任务队列
-    # 任务格式为：(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, subtitle_area字幕区域)
-    task_queue = Queue()
-    # 创建一个进度更新队列
-    progress_queue = Queue()
-    # 新建一个进程
-    p = Process(target=subtitle_extract_handler,
-                args=(task_queue, progress_queue, video_path, raw_subtitle_path, sub_area, SimpleNamespace(**options),))
+    # 任务格式为：(seq任务序号, total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, total_ms当前帧时间, subtitle_area字幕区域, frame_ref共享内存帧引用)
+    # 任务队列满时主进程的提取等待OCR进程，任务序号由返回给主进程的SequencedTaskQueue添加
+    task_queue = bounded_queue('задач OCR', options['TASK_QUEUE_SIZE'])
+    # OCR工作进程共享的错误标志，出错时主进程停止等待并抛出异常
+    error_flag = Value('b', 0)
+    # OCR工作进程内部的OCR队列统计
+    ocr_queue_metrics = QueueMetrics('кадров OCR', options['OCR_QUEUE_SIZE'])
+    # 创建一个识别结果队列
+    result_queue = bounded_queue('результатов OCR', options['RESULT_QUEUE_SIZE'])
+    # 创建一个进度更新队列，每个识别结果最多对应一次进度更新
+    progress_queue = bounded_queue('прогресса OCR', options['RESULT_QUEUE_SIZE'])
+    queue_metrics = [task_queue.metrics, ocr_queue_metrics, result_queue.metrics, progress_queue.metrics]
+    if frame_ring is not None:
+        queue_metrics.insert(0, frame_ring.free_slots.metrics)
+    processes = []
+    # 新建OCR工作进程
+    for _ in range(worker_num):
+        processes.append(Process(target=subtitle_extract_handler,
+                                 args=(task_queue, result_queue, video_path, sub_area,
+                                       SimpleNamespace(**options), frame_ring, ocr_queue_metrics, error_flag,)))
+    # 新建写入进程
+    processes.append(Process(target=subtitle_write_handler,
+                             args=(result_queue, progress_queue, raw_subtitle_path, worker_num,
+                                   resume_offset is not None,)))
     # 启动进程
-    p.start()
-    return p, task_queue, progress_queue
+    for p in processes:
+        p.start()
+    return OcrProcessPool(processes, queue_metrics, error_flag), SequencedTaskQueue(task_queue), progress_queue
 
 
 def frame_preprocess(subtitle_area, frame):
     """
     将视频帧进行裁剪
     """
-    # 对于分辨率大于1920*1080的视频，将其视频帧进行等比缩放至1280*720进行识别
-    # paddlepaddle会将图像压缩为640*640
-    # if self.frame_width > 1280:
-    #     scale_rate = round(float(1280 / self.frame_width), 2)
-    #     frames = cv2.resize(frames, None, fx=scale_rate, fy=scale_rate, interpolation=cv2.INTER_AREA)
+    # 高分辨率视频帧的缩放由AdaptiveScaler在识别前根据视频帧高度完成，坐标会换算回原始帧，这里只做裁剪
     # 如果字幕出现的区域在下部分
     if subtitle_area == SubtitleArea.LOWER_PART:
         cropped = int(frame.shape[0] // 2)